@@ -1,125 +1,155 @@
-import requests
+import argparse
+import contextlib
 import json
 import os
-from dotenv import load_dotenv
+import sys
 
-load_dotenv()
+import log
+from fluxo import registros_json
+from municipios import INDICE_ARQUIVO, IndiceCidades, municipio_do_item_ibge
+from sankhya import fatiar_lotes, salvar_registros, transporte
 
-auth_url = os.getenv("SANKHYA_AUTH_URL")
-api_url = os.getenv("SANKHYA_API_URL")
-app_key = os.getenv("SANKHYA_APP_KEY")
-auth_token = os.getenv("SANKHYA_AUTH_TOKEN")
-username = os.getenv("SANKHYA_USERNAME")
-password = os.getenv("SANKHYA_PASSWORD")
-
-IBGE_MUNICIPIOS_URL = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios/"
+IBGE_MUNICIPIOS_URL = os.getenv("IBGE_MUNICIPIOS_URL", "https://servicodados.ibge.gov.br/api/v1/localidades/municipios/")
 CHUNK_SIZE = 500
 
-def get_bearer_token():
-    headers = {"AppKey": app_key, "Token": auth_token, "Username": username, "Password": password}
-    r = requests.post(auth_url, headers=headers, timeout=60)
-    if r.status_code == 200:
-        token = r.json().get("bearerToken")
-        if not token:
-            raise Exception("Token não encontrado na resposta.")
-        return token
-    raise Exception(f"Erro ao autenticar: {r.status_code} - {r.text}")
-
-
-def obter_municipios_ibge():
-    r = requests.get(IBGE_MUNICIPIOS_URL, timeout=120)
-    if r.status_code != 200:
-        raise Exception(f"Falha ao consultar IBGE: {r.status_code} - {r.text}")
-    dados = r.json()
-    if not isinstance(dados, list):
-        raise Exception("Resposta inesperada do IBGE.")
-    municipios = []
-    for item in dados:
-        mid = item.get("id")
-        nome = item.get("nome")
-        if mid is None or nome is None:
-            continue
-        municipios.append({"id": mid, "nome": nome})
-    return municipios
-
-
-def enviar_lote_para_sankhya(lote, headers):
-    fields = ["ID", "MUNICIPIO"]
-    records = [{"values": {"0": m["id"], "1": m["nome"]}} for m in lote]
-    payload = {
-        "serviceName": "DatasetSP.save",
-        "requestBody": {"entityName": "AD_TGSMDF", "standAlone": False, "fields": fields, "records": records},
-    }
-    return requests.post(api_url, headers=headers, data=json.dumps(payload), timeout=120)
+# Retrato da última sincronização bem-sucedida com AD_TGSMDF
+SNAPSHOT_ARQUIVO = os.getenv("IBGE_SNAPSHOT", ".ibge_municipios.json")
 
 
-def enviar_unitario(m, headers):
+def ler_snapshot():
+    try:
+        with open(SNAPSHOT_ARQUIVO, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        dados["municipios"] = {int(mid): nome for mid, nome in dados.get("municipios", {}).items()}
+        return dados
+    except (OSError, ValueError):
+        return {"municipios": {}}
+
+
+def gravar_snapshot(snapshot):
+    tmp = f"{SNAPSHOT_ARQUIVO}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, SNAPSHOT_ARQUIVO)
+
+
+@contextlib.contextmanager
+def baixar_municipios_ibge(snapshot=None):
+    """Abre a lista do IBGE em fluxo. Entrega (municipios, validadores), ou (None, {}) se nada mudou.
+
+    municipios é um gerador de Municipio lido direto da resposta, sem guardar
+    o JSON nem uma lista intermediária. Com um snapshot, a consulta é
+    condicional (If-None-Match / If-Modified-Since).
+    """
+    headers = {}
+    if snapshot:
+        if snapshot.get("etag"):
+            headers["If-None-Match"] = snapshot["etag"]
+        if snapshot.get("last_modified"):
+            headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    with transporte.fluxo(IBGE_MUNICIPIOS_URL, headers=headers, timeout=120) as (r, pedacos):
+        if r.status_code == 304:
+            yield None, {}
+            return
+        if r.status_code != 200:
+            corpo = b"".join(pedacos)[:500].decode("utf-8", "replace")
+            raise Exception(f"Falha ao consultar IBGE: {r.status_code} - {corpo}")
+
+        validadores = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+        yield registros_json(pedacos, municipio_do_item_ibge), validadores
+
+
+def enviar_lote_para_sankhya(lote):
+    """Envia um lote de municípios; lotes recusados são divididos até isolar os registros com erro."""
     fields = ["ID", "MUNICIPIO"]
-    payload = {
-        "serviceName": "DatasetSP.save",
-        "requestBody": {"entityName": "AD_TGSMDF", "standAlone": False, "fields": fields, "records": [{"values": {"0": m["id"], "1": m["nome"]}}]},
-    }
-    return requests.post(api_url, headers=headers, data=json.dumps(payload), timeout=120)
-
-
-def chunks(lst, size):
-    for i in range(0, len(lst), size):
-        yield lst[i : i + size]
+    itens = [(m.id, {"0": m.id, "1": m.nome}) for m in lote]
+    return salvar_registros("AD_TGSMDF", fields, itens)
+
+
+def executar(completo=False):
+    """Sincroniza os municípios do IBGE com AD_TGSMDF.
+
+    Só envia municípios novos ou renomeados desde o último snapshot; com
+    completo=True reenvia a lista inteira. A resposta é lida em fluxo e
+    guarda só tuplas compactas dos alterados; a conexão com o IBGE é fechada
+    antes do primeiro envio, para que novas tentativas e pausas do Sankhya não
+    derrubem a leitura. O snapshot dos aceitos é gravado mesmo se a execução
+    falhar no meio. Sempre que a lista muda, regrava o índice cidade/UF ->
+    código usado pelo TGSPAR. Retorna {"lidos": municípios enviados ao
+    Sankhya, "sucessos": aceitos}.
+    """
+    total_ok, total_fail = 0, 0
+    concluido = False
+    snapshot = {"municipios": {}} if completo else ler_snapshot()
+    anteriores = snapshot["municipios"]
+    validadores = {}
+    try:
+        # Sem índice de cidades gravado, baixa a lista mesmo que não tenha mudado para gerá-lo
+        condicional = anteriores and os.path.exists(INDICE_ARQUIVO)
+        indice, atuais, alterados = IndiceCidades(), set(), []
+
+        with baixar_municipios_ibge(snapshot if condicional else None) as (municipios, validadores):
+            if municipios is None:
+                log.info("Lista de municípios do IBGE sem alterações desde a última sincronização.")
+                return {"lidos": 0, "sucessos": 0}
+            for m in municipios:
+                indice.adicionar(m)
+                atuais.add(m.id)
+                if anteriores.get(m.id) != m.nome:
+                    alterados.append(m)
+
+        if not atuais:
+            raise Exception("Resposta inesperada do IBGE: nenhum município na lista.")
+        log.info(f"{len(atuais)} municípios retornados pelo IBGE, {len(alterados)} novos ou renomeados.")
+        indice.gravar()
+
+        # CHUNK_SIZE é só o tamanho inicial; o controlador de AD_TGSMDF ajusta a partir do que a API aguenta
+        for idx, lote in enumerate(fatiar_lotes("AD_TGSMDF", alterados, CHUNK_SIZE), start=1):
+            sucessos, falhas = enviar_lote_para_sankhya(lote)
+            total_ok += len(sucessos)
+            total_fail += len(falhas)
+            nomes = {m.id: m.nome for m in lote}
+            for mid in sucessos:
+                anteriores[mid] = nomes[mid]
+            if falhas:
+                log.erro(f"Lote {idx}: {len(sucessos)} enviados, {len(falhas)} com erro.")
+                for mid, detalhe in falhas:
+                    log.erro(f"ID={mid} '{nomes[mid]}' - {detalhe}", entidade="AD_TGSMDF", chave=mid)
+            else:
+                log.ok(f"Lote {idx} enviado: +{len(lote)} registros.")
+
+        removidos = [mid for mid in anteriores if mid not in atuais]
+        for mid in removidos:
+            # DatasetSP.save não exclui registros; a remoção em AD_TGSMDF fica a cargo do Sankhya
+            log.aviso(f"ID={mid} '{anteriores[mid]}' não existe mais no IBGE.")
+            del anteriores[mid]
+        concluido = True
+
+        log.resumo(f"Sucessos: {total_ok} | Falhas: {total_fail}")
+    except Exception as e:
+        log.fatal(f"{str(e)}")
+        raise
+    finally:
+        # Guarda os aceitos mesmo numa falha no meio, para a próxima execução não reenviá-los.
+        # Os validadores só valem se tudo foi lido e aceito; senão a próxima execução baixa
+        # de novo e reenvia apenas o que falhou
+        if concluido or total_ok:
+            novo_snapshot = {"municipios": anteriores}
+            if concluido and not total_fail:
+                novo_snapshot.update(validadores)
+            try:
+                gravar_snapshot(novo_snapshot)
+            except OSError as e:
+                log.erro(f"Falha ao gravar o snapshot dos municípios: {str(e)}")
+    return {"lidos": total_ok + total_fail, "sucessos": total_ok}
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza os municípios do IBGE com AD_TGSMDF.")
+    parser.add_argument("--completo", action="store_true", help="ignora o snapshot e reenvia todos os municípios")
+    args = parser.parse_args()
     try:
-        token = get_bearer_token()
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
-
-        municipios = obter_municipios_ibge()
-        print(f"[INFO] {len(municipios)} municípios retornados pelo IBGE.")
-
-        total_ok, total_fail = 0, 0
-        lotes = list(chunks(municipios, CHUNK_SIZE))
-        for idx, lote in enumerate(lotes, start=1):
-            try:
-                resp = enviar_lote_para_sankhya(lote, headers)
-                if resp.status_code == 200:
-                    dados = resp.json()
-                    if isinstance(dados, dict) and dados.get("status") == "ERROR":
-                        print(f"[ERRO] Lote {idx}/{len(lotes)} falhou (retorno ERROR). Tentando unitário...")
-                        for m in lote:
-                            r2 = enviar_unitario(m, headers)
-                            if r2.status_code == 200 and not (isinstance(r2.json(), dict) and r2.json().get("status") == "ERROR"):
-                                total_ok += 1
-                                print(f"  [OK] ID={m['id']} '{m['nome']}' enviado.")
-                            else:
-                                total_fail += 1
-                                print(f"  [ERRO] ID={m['id']} - {r2.status_code}: {r2.text}")
-                    else:
-                        total_ok += len(lote)
-                        print(f"[OK] Lote {idx}/{len(lotes)} enviado: +{len(lote)} registros.")
-                else:
-                    print(f"[ERRO] Lote {idx}/{len(lotes)} HTTP {resp.status_code}. Tentando unitário...")
-                    for m in lote:
-                        r2 = enviar_unitario(m, headers)
-                        if r2.status_code == 200 and not (isinstance(r2.json(), dict) and r2.json().get("status") == "ERROR"):
-                            total_ok += 1
-                            print(f"  [OK] ID={m['id']} '{m['nome']}' enviado.")
-                        else:
-                            total_fail += 1
-                            print(f"  [ERRO] ID={m['id']} - {r2.status_code}: {r2.text}")
-            except Exception as e:
-                print(f"[EXCEÇÃO] Lote {idx}/{len(lotes)} - {str(e)}. Tentando unitário...")
-                for m in lote:
-                    try:
-                        r2 = enviar_unitario(m, headers)
-                        if r2.status_code == 200 and not (isinstance(r2.json(), dict) and r2.json().get("status") == "ERROR"):
-                            total_ok += 1
-                            print(f"  [OK] ID={m['id']} '{m['nome']}' enviado.")
-                        else:
-                            total_fail += 1
-                            print(f"  [ERRO] ID={m['id']} - {r2.status_code}: {r2.text}")
-                    except Exception as ee:
-                        total_fail += 1
-                        print(f"  [EXCEÇÃO] ID={m['id']} - {str(ee)}")
-
-        print(f"[RESUMO] Sucessos: {total_ok} | Falhas: {total_fail}")
-    except Exception as e:
-        print(f"[FATAL] {str(e)}")
\ No newline at end of file
+        executar(args.completo)
+    except Exception:
+        sys.exit(1)
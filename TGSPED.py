@@ -0,0 +1,18 @@
+import sys
+from sincronizador import sincronizar_pedidos
+
+
+def executar(a_partir_de=None):
+    """Integra pedidos completos: AD_TGSCAB, AD_TGSITE e AD_TGSSER no mesmo lote.
+
+    Com a_partir_de lê só pedidos com id maior que o informado (modo daemon).
+    Retorna {"lidos": pedidos lidos, "ultima_chave": maior id_pedido lido}.
+    """
+    return sincronizar_pedidos(a_partir_de=a_partir_de)
+
+
+if __name__ == "__main__":
+    try:
+        executar()
+    except Exception:
+        sys.exit(1)
@@ -0,0 +1,438 @@
+import mysql.connector
+import mysql.connector.pooling
+import os
+import re
+import socket
+import threading
+import time
+from dotenv import load_dotenv
+
+import metricas
+
+# Carrega variáveis do .env
+load_dotenv()
+
+# Conexão MySQL (nuvem - Hostinger)
+mysql_config = {
+    'host': os.getenv("MYSQL_HOST"),
+    'user': os.getenv("MYSQL_USER"),
+    'password': os.getenv("MYSQL_PASSWORD"),
+    'database': os.getenv("MYSQL_DATABASE")
+}
+
+# Gravação em lote do status 'integrado'
+FLUSH_TAMANHO = max(1, int(os.getenv("MYSQL_FLUSH_TAMANHO", "500")))
+FLUSH_INTERVALO = float(os.getenv("MYSQL_FLUSH_INTERVALO", "5"))
+
+# Linhas lidas por página na leitura dos pendentes
+PAGINA_TAMANHO = max(1, int(os.getenv("MYSQL_PAGINA", "1000")))
+
+# Reserva de trabalho para rodar vários workers sobre as mesmas tabelas
+MODO_RESERVA = os.getenv("MYSQL_MODO_RESERVA", "0") == "1"
+RESERVA_SEGUNDOS = int(os.getenv("MYSQL_RESERVA_SEGUNDOS", "900"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Conexões reaproveitadas entre etapas quando rodam no mesmo processo (pipeline.py)
+POOL_TAMANHO = int(os.getenv("MYSQL_POOL_TAMANHO", "8"))
+
+_consultas = metricas.histograma("integracao_mysql_consulta_segundos", "Tempo de cada página lida dos pendentes")
+_linhas_lidas = metricas.contador("integracao_mysql_linhas_lidas_total", "Linhas pendentes lidas do MySQL")
+_marcacoes = metricas.histograma("integracao_mysql_marcacao_segundos", "Tempo de cada gravação de status (UPDATE + commit)")
+_marcados = metricas.contador("integracao_registros_marcados_total", "Registros marcados como integrados no MySQL")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def conectar():
+    """Obtém uma conexão do pool do processo; close() a devolve ao pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="integracao", pool_size=POOL_TAMANHO, **mysql_config
+            )
+    return _pool.get_connection()
+
+
+def _tabela(select):
+    encontrado = re.search(r"\bFROM\s+(\w+)", select, re.IGNORECASE)
+    return encontrado.group(1) if encontrado else ""
+
+
+def ler_pendentes(conn, select, chave, filtro, pagina=PAGINA_TAMANHO, inicio=None, reserva=None):
+    """Lê os registros pendentes em páginas ordenadas pela chave (keyset).
+
+    Cada página é buscada com WHERE chave > última_lida ORDER BY chave LIMIT n,
+    então a memória fica limitada a uma página e o primeiro envio começa logo
+    após a primeira consulta. Use uma conexão só para leitura.
+
+    Com MYSQL_MODO_RESERVA=1 e reserva=(tabela, coluna_status), cada página é
+    antes reservada para este worker (ver ler_reservados).
+    """
+    if MODO_RESERVA and reserva:
+        yield from ler_reservados(conn, select, reserva[0], chave, filtro, reserva[1], pagina, inicio)
+        return
+
+    tabela = _tabela(select)
+    ultima = inicio
+    cursor = conn.cursor(dictionary=True)
+    try:
+        while True:
+            with _consultas.cronometrar(tabela=tabela):
+                if ultima is None:
+                    cursor.execute(f"{select} WHERE {filtro} ORDER BY {chave} LIMIT %s", (pagina,))
+                else:
+                    cursor.execute(f"{select} WHERE {filtro} AND {chave} > %s ORDER BY {chave} LIMIT %s", (ultima, pagina))
+                linhas = cursor.fetchall()
+            _linhas_lidas.inc(len(linhas), tabela=tabela)
+            yield from linhas
+            if len(linhas) < pagina:
+                return
+            ultima = linhas[-1][chave]
+    finally:
+        cursor.close()
+
+
+def ler_por_chaves(conn, select, coluna, chaves, filtro=None):
+    """Lê numa única consulta as linhas cuja coluna está em chaves (ex.: os itens de um lote de pedidos)."""
+    if not chaves:
+        return []
+    marcadores = ", ".join(["%s"] * len(chaves))
+    condicao = f"{coluna} IN ({marcadores})" + (f" AND ({filtro})" if filtro else "")
+    tabela = _tabela(select)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        with _consultas.cronometrar(tabela=tabela):
+            cursor.execute(f"{select} WHERE {condicao} ORDER BY {coluna}", tuple(chaves))
+            linhas = cursor.fetchall()
+    finally:
+        cursor.close()
+    _linhas_lidas.inc(len(linhas), tabela=tabela)
+    return linhas
+
+
+def marcar_duplicados(conn, tabela, chave, expressao, filtro, coluna="integrado"):
+    """Marca, numa única instrução, os pendentes repetidos pela expressão de deduplicação.
+
+    Entre os pendentes com o mesmo valor de expressao (ex.: o documento só com
+    dígitos), fica pendente apenas o de menor chave; os demais recebem
+    coluna = TRUE sem passar pelo Python, como os [SKIP] da leitura faziam um
+    a um. Usa ROW_NUMBER() (MySQL 8.0+ / MariaDB 10.2+). Retorna a quantidade
+    de linhas marcadas.
+    """
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE {tabela} AS t JOIN ("
+            f"SELECT {chave} FROM ("
+            f"SELECT {chave}, ROW_NUMBER() OVER (PARTITION BY {expressao} ORDER BY {chave}) AS ordem "
+            f"FROM {tabela} WHERE {filtro} AND {expressao} IS NOT NULL AND {expressao} <> ''"
+            f") AS r WHERE r.ordem > 1"
+            f") AS d ON t.{chave} = d.{chave} SET t.{coluna} = TRUE"
+        )
+        marcados = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    _marcacoes.observar(time.perf_counter() - inicio, tabela=tabela)
+    _marcados.inc(marcados, tabela=tabela, coluna=coluna)
+    return marcados
+
+
+def criar_indice(conn, tabela, colunas):
+    """Cria o índice (colunas) na tabela, se nenhum índice existente já começar por elas.
+
+    Com (integrado, chave), buscar os pendentes de uma tabela quase toda
+    integrada vira uma leitura de intervalo no índice em vez de varrer a
+    tabela. Retorna o nome do índice criado, ou None se já havia um.
+    """
+    colunas = [c.lower() for c in colunas]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (tabela,),
+        )
+        existentes = {}
+        for indice, coluna in cursor.fetchall():
+            existentes.setdefault(indice, []).append(coluna.lower())
+        if any(cols[: len(colunas)] == colunas for cols in existentes.values()):
+            return None
+        nome = f"idx_{tabela}_{'_'.join(colunas)}"[:64]
+        cursor.execute(f"CREATE INDEX {nome} ON {tabela} ({', '.join(colunas)})")
+        conn.commit()
+        return nome
+    finally:
+        cursor.close()
+
+
+_reservas_verificadas = set()
+
+
+def _colunas_reserva(cursor, tabela, coluna):
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME IN (%s, %s)",
+        (tabela, f"{coluna}_reserva", f"{coluna}_reserva_ate"),
+    )
+    return {linha[0].lower() for linha in cursor.fetchall()}
+
+
+def criar_colunas_reserva(conn, tabela, coluna):
+    """Cria as colunas <coluna>_reserva e <coluna>_reserva_ate, se ainda não existirem (migrar.py).
+
+    Retorna a lista de colunas criadas.
+    """
+    criadas = []
+    cursor = conn.cursor()
+    try:
+        existentes = _colunas_reserva(cursor, tabela, coluna)
+        for nome, tipo in ((f"{coluna}_reserva", "VARCHAR(64)"), (f"{coluna}_reserva_ate", "DATETIME")):
+            if nome.lower() in existentes:
+                continue
+            try:
+                cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo} NULL")
+                criadas.append(nome)
+            except mysql.connector.Error as e:
+                # 1060: coluna criada por outro migrar.py rodando ao mesmo tempo
+                if e.errno != 1060:
+                    raise
+        conn.commit()
+    finally:
+        cursor.close()
+    return criadas
+
+
+def verificar_reserva(conn, tabela, coluna):
+    """Falha com uma mensagem clara se as colunas de reserva não existirem (crie-as com migrar.py)."""
+    if (tabela, coluna) in _reservas_verificadas:
+        return
+    cursor = conn.cursor()
+    try:
+        existentes = _colunas_reserva(cursor, tabela, coluna)
+    finally:
+        cursor.close()
+    faltando = [nome for nome in (f"{coluna}_reserva", f"{coluna}_reserva_ate") if nome.lower() not in existentes]
+    if faltando:
+        raise Exception(
+            f"MYSQL_MODO_RESERVA=1 exige as colunas {', '.join(faltando)} em {tabela}. "
+            f"Rode 'python migrar.py --reserva' com um usuário que possa alterar tabelas."
+        )
+    _reservas_verificadas.add((tabela, coluna))
+
+
+def renovar_reserva(conn, tabela, chave, chaves, coluna="integrado", worker=WORKER_ID, duracao=RESERVA_SEGUNDOS):
+    """Renova a reserva deste worker sobre chaves por mais duracao segundos.
+
+    Retorna as chaves que continuam deste worker, na ordem recebida; as que
+    venceram e já foram reservadas por outro não devem ser enviadas. Sem
+    MYSQL_MODO_RESERVA, retorna chaves sem consultar o banco.
+    """
+    if not MODO_RESERVA or not chaves:
+        return list(chaves)
+    marcadores = ", ".join(["%s"] * len(chaves))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE {tabela} SET {coluna}_reserva_ate = NOW() + INTERVAL %s SECOND "
+            f"WHERE {chave} IN ({marcadores}) AND {coluna}_reserva = %s",
+            (duracao, *chaves, worker),
+        )
+        cursor.execute(
+            f"SELECT {chave} FROM {tabela} WHERE {chave} IN ({marcadores}) AND {coluna}_reserva = %s",
+            (*chaves, worker),
+        )
+        minhas = {linha[0] for linha in cursor.fetchall()}
+        conn.commit()
+    finally:
+        cursor.close()
+    return [c for c in chaves if c in minhas]
+
+
+class Reserva:
+    """Mantém a reserva deste worker sobre as linhas em envio (MYSQL_MODO_RESERVA=1).
+
+    Novas tentativas, pausas do disjuntor e lotes recusados divididos ao meio
+    podem fazer um envio passar da validade da reserva; se ela vencer, outro
+    worker pode pegar e enviar as mesmas linhas. Por isso garantir(chaves)
+    roda antes de cada tentativa de envio: se alguma chave pode vencer
+    durante a tentativa (validade restante menor que margem, o pior caso de
+    uma tentativa), renova todas de uma vez e lança exceção se alguma já foi
+    retomada por outro worker, cancelando o envio. Com validade de sobra,
+    não consulta o banco. Usa a conexão de status, com o mesmo lock dos
+    marcadores que a compartilham. Sem MYSQL_MODO_RESERVA, não faz nada.
+    """
+
+    def __init__(self, conn, tabela, chave, coluna="integrado", margem=0, lock=None,
+                 worker=WORKER_ID, duracao=RESERVA_SEGUNDOS):
+        if MODO_RESERVA and duracao <= margem:
+            raise Exception(
+                f"MYSQL_RESERVA_SEGUNDOS={duracao} não cobre o pior caso de uma tentativa de envio ({margem:g}s). "
+                f"Use um valor maior que {margem:g}."
+            )
+        self.conn = conn
+        self.tabela = tabela
+        self.chave = chave
+        self.coluna = coluna
+        self.margem = margem
+        self.worker = worker
+        self.duracao = duracao
+        self._validade = {}
+        self._ultima_limpeza = time.monotonic()
+        self._lock = lock or threading.Lock()
+
+    def renovar(self, chaves):
+        """Renova a reserva das chaves que podem vencer; retorna as que continuam deste worker, em ordem."""
+        if not MODO_RESERVA or not chaves:
+            return list(chaves)
+        # Validade local medida antes do UPDATE: nunca depois da gravada pelo MySQL
+        agora = time.monotonic()
+        with self._lock:
+            if all(self._validade.get(c, 0) - agora > self.margem for c in chaves):
+                return list(chaves)
+            minhas = renovar_reserva(self.conn, self.tabela, self.chave, chaves, self.coluna, self.worker, self.duracao)
+            for c in minhas:
+                self._validade[c] = agora + self.duracao
+            if agora - self._ultima_limpeza > self.duracao:
+                self._validade = {c: v for c, v in self._validade.items() if v > agora}
+                self._ultima_limpeza = agora
+        return minhas
+
+    def garantir(self, chaves):
+        """Como renovar, mas lança exceção se alguma chave já foi retomada por outro worker."""
+        perdidas = len(chaves) - len(self.renovar(chaves))
+        if perdidas:
+            raise Exception(f"Reserva de {perdidas} registros de {self.tabela} vencida e retomada por outro worker. "
+                            f"Envio cancelado.")
+
+
+def ler_reservados(conn, select, tabela, chave, filtro, coluna="integrado",
+                   pagina=PAGINA_TAMANHO, inicio=None, worker=WORKER_ID, duracao=RESERVA_SEGUNDOS):
+    """Lê os pendentes reservando cada página para este worker.
+
+    As chaves livres (sem reserva ou com reserva vencida) são escolhidas com
+    SELECT ... FOR UPDATE SKIP LOCKED e recebem <coluna>_reserva = worker e
+    <coluna>_reserva_ate = NOW() + duracao na mesma transação. Assim N
+    processos, no mesmo host ou não, dividem o backlog sem enviar a mesma
+    linha duas vezes; se um worker cair, suas linhas voltam a ficar livres
+    quando a reserva vence. Requer MySQL 8.0+ ou MariaDB 10.6+ e as colunas
+    criadas por migrar.py --reserva. Durante o envio, a validade é mantida
+    por Reserva.garantir antes de cada tentativa.
+    """
+    verificar_reserva(conn, tabela, coluna)
+    livre = f"({coluna}_reserva_ate IS NULL OR {coluna}_reserva_ate < NOW())"
+    ultima = inicio
+    cursor = conn.cursor(dictionary=True)
+    try:
+        while True:
+            inicio_pagina = time.perf_counter()
+            if ultima is None:
+                cursor.execute(
+                    f"SELECT {chave} FROM {tabela} WHERE {filtro} AND {livre} "
+                    f"ORDER BY {chave} LIMIT %s FOR UPDATE SKIP LOCKED",
+                    (pagina,),
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {chave} FROM {tabela} WHERE {filtro} AND {livre} AND {chave} > %s "
+                    f"ORDER BY {chave} LIMIT %s FOR UPDATE SKIP LOCKED",
+                    (ultima, pagina),
+                )
+            chaves = [linha[chave] for linha in cursor.fetchall()]
+            if not chaves:
+                conn.commit()
+                return
+
+            marcadores = ", ".join(["%s"] * len(chaves))
+            cursor.execute(
+                f"UPDATE {tabela} SET {coluna}_reserva = %s, "
+                f"{coluna}_reserva_ate = NOW() + INTERVAL %s SECOND WHERE {chave} IN ({marcadores})",
+                (worker, duracao, *chaves),
+            )
+            conn.commit()
+
+            cursor.execute(f"{select} WHERE {chave} IN ({marcadores}) ORDER BY {chave}", tuple(chaves))
+            linhas = cursor.fetchall()
+            _consultas.observar(time.perf_counter() - inicio_pagina, tabela=tabela)
+            _linhas_lidas.inc(len(linhas), tabela=tabela)
+            yield from linhas
+            if len(chaves) < pagina:
+                return
+            ultima = chaves[-1]
+    finally:
+        cursor.close()
+
+
+class Marcador:
+    """Marca registros como integrados em lote, numa conexão única protegida por lock.
+
+    As chaves confirmadas pela API são acumuladas e gravadas com um único
+    UPDATE ... WHERE chave IN (...) + commit quando o buffer atinge
+    MYSQL_FLUSH_TAMANHO chaves ou passa MYSQL_FLUSH_INTERVALO segundos desde a
+    última gravação. Só entram no buffer registros já aceitos pelo Sankhya;
+    se o processo cair antes do flush, o diário local (diario.py) os entrega de
+    novo na próxima execução. ao_gravar, se informado, recebe as chaves de
+    cada flush confirmado.
+
+    coluna pode ser uma tupla para marcar várias colunas no mesmo UPDATE
+    (ex.: integrado e integradoser). Marcadores que compartilham a conexão
+    devem receber o mesmo lock.
+    """
+
+    def __init__(self, conn, tabela, chave, coluna="integrado",
+                 tamanho=FLUSH_TAMANHO, intervalo=FLUSH_INTERVALO, ao_gravar=None, lock=None):
+        self.conn = conn
+        self.ao_gravar = ao_gravar
+        self.tabela = tabela
+        self.chave = chave
+        self.colunas = (coluna,) if isinstance(coluna, str) else tuple(coluna)
+        self.coluna = ",".join(self.colunas)
+        self.tamanho = tamanho
+        self.intervalo = intervalo
+        self._pendentes = []
+        self._ultimo_flush = time.monotonic()
+        self._lock = lock or threading.Lock()
+
+    def marcar(self, chaves):
+        with self._lock:
+            self._pendentes.extend(chaves)
+            if len(self._pendentes) >= self.tamanho or time.monotonic() - self._ultimo_flush >= self.intervalo:
+                self._descarregar()
+
+    def descarregar(self):
+        with self._lock:
+            self._descarregar()
+
+    def _descarregar(self):
+        self._ultimo_flush = time.monotonic()
+        if not self._pendentes:
+            return
+        inicio_flush = time.perf_counter()
+        atribuicoes = ", ".join(f"{coluna} = TRUE" for coluna in self.colunas)
+        cursor = self.conn.cursor()
+        try:
+            for inicio in range(0, len(self._pendentes), self.tamanho):
+                bloco = self._pendentes[inicio : inicio + self.tamanho]
+                marcadores = ", ".join(["%s"] * len(bloco))
+                cursor.execute(
+                    f"UPDATE {self.tabela} SET {atribuicoes} WHERE {self.chave} IN ({marcadores})",
+                    tuple(bloco),
+                )
+            self.conn.commit()
+            gravadas, self._pendentes = self._pendentes, []
+            _marcacoes.observar(time.perf_counter() - inicio_flush, tabela=self.tabela)
+            _marcados.inc(len(gravadas), tabela=self.tabela, coluna=self.coluna)
+        except Exception:
+            # Mantém as chaves no buffer para a próxima tentativa
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        if self.ao_gravar:
+            self.ao_gravar(gravadas)
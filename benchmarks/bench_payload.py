@@ -0,0 +1,177 @@
+"""Micro-benchmark da montagem do payload DatasetSP.save (registros/s).
+
+Compara a montagem antiga (dict values + envelope + json.dumps por lote) com
+o modelo pré-compilado de payload.py, com json da biblioteca padrão e com
+orjson quando instalado. Não acessa MySQL nem a API.
+
+    python benchmarks/bench_payload.py [--registros 100000] [--lote 100]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import payload  # noqa: E402
+from entidades import CABECALHOS, ITENS, PARCEIROS, SERIES  # noqa: E402
+
+
+def linhas_itens(n):
+    return [
+        {"id_item": i, "id_pedido": i // 5, "id_produto": 1000 + i % 300, "quantidade": 1 + i % 7,
+         "preco_unitario": Decimal("19.90") + i % 50, "desconto": Decimal("0.00")}
+        for i in range(n)
+    ]
+
+
+def linhas_pedidos(n):
+    return [
+        {"id_pedido": i, "id_cliente": i % 900, "forma_pagamento": "cartao",
+         "data_pedido": datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365), "observacao": "entregar à tarde"}
+        for i in range(n)
+    ]
+
+
+def linhas_clientes(n):
+    return [
+        {"id_cliente": i, "nome": f"Cliente {i}", "documento": f"{i:011d}", "email": f"c{i}@exemplo.com",
+         "telefone": "11999990000", "rua": "Rua das Flores", "numero": str(i % 900), "cep": "01001000",
+         "bairro": "Centro", "cidade": "São Paulo", "estado": "SP", "complemento": ""}
+        for i in range(n)
+    ]
+
+
+def linhas_itens_com_series(n):
+    # Duas séries por item: n registros
+    return [
+        {"id_item": i, "id_pedido": i // 5, "numeros_serie": json.dumps([f"SN{i}A", f"SN{i}B"])}
+        for i in range(n // 2)
+    ]
+
+
+# --- MONTAGEM ANTIGA (como nos scripts TGS* originais) ---
+def valores_antigos_itens(pedido_iten):
+    return {
+        "0": pedido_iten["id_item"],
+        "1": pedido_iten["id_pedido"],
+        "2": pedido_iten["quantidade"],
+        "3": float(pedido_iten["preco_unitario"]),
+        "4": float(pedido_iten["desconto"]),
+        "5": pedido_iten["id_produto"],
+    }
+
+
+def valores_antigos_pedidos(pedido):
+    return {
+        "0": pedido["id_pedido"],
+        "1": pedido["id_cliente"],
+        "2": pedido["forma_pagamento"],
+        "3": pedido["data_pedido"].strftime("%d/%m/%Y"),
+        "4": pedido["observacao"],
+    }
+
+
+def valores_antigos_clientes(cliente):
+    return {
+        "0": cliente["id_cliente"],
+        "1": cliente["nome"],
+        "2": cliente["documento"],
+        "3": cliente["email"],
+        "4": cliente["telefone"],
+        "5": cliente["rua"],
+        "6": cliente["numero"],
+        "7": cliente["cep"],
+        "8": cliente["bairro"],
+        "9": cliente["cidade"],
+        "10": cliente["estado"],
+        "11": cliente["complemento"],
+    }
+
+
+def valores_antigos_series(pedido_iten):
+    series = json.loads(pedido_iten["numeros_serie"])
+    if not isinstance(series, list):
+        raise ValueError("Formato inválido: esperado array JSON.")
+    return [{"0": pedido_iten["id_item"], "1": pedido_iten["id_pedido"], "2": serie} for serie in series]
+
+
+def antigo(entidade, fields, valores, linhas, lote):
+    for corpo_records in _fatias(entidade, valores, linhas, lote):
+        corpo = {
+            "serviceName": "DatasetSP.save",
+            "requestBody": {
+                "entityName": entidade,
+                "standAlone": False,
+                "fields": list(fields),
+                "records": [{"values": values} for values in corpo_records],
+            },
+        }
+        json.dumps(corpo).encode("utf-8")
+
+
+def compilado(entidade, linhas, lote, dumps):
+    modelo = payload.ModeloPayload(entidade.nome, entidade.fields)
+    modelo_dumps, payload.dumps = payload.dumps, dumps
+    if entidade.registros:
+        valores = lambda linha: [values for _, values in entidade.registros(linha, None)]  # noqa: E731
+    else:
+        valores = entidade.valores
+    try:
+        for lista_values in _fatias(entidade.nome, valores, linhas, lote):
+            modelo.serializar(lista_values)
+    finally:
+        payload.dumps = modelo_dumps
+
+
+def _fatias(entidade, valores, linhas, lote):
+    """Listas de values por lote; em AD_TGSSER cada linha (item) gera vários registros (séries)."""
+    if entidade != SERIES.nome:
+        for i in range(0, len(linhas), lote):
+            yield [valores(linha) for linha in linhas[i : i + lote]]
+        return
+    registros = [values for linha in linhas for values in valores(linha)]
+    for i in range(0, len(registros), lote):
+        yield registros[i : i + lote]
+
+
+def medir(nome, funcao, registros, repeticoes=3):
+    melhor = min(_cronometrar(funcao) for _ in range(repeticoes))
+    print(f"  {nome:<28} {registros / melhor:>12,.0f} registros/s")
+
+
+def _cronometrar(funcao):
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--registros", type=int, default=100000)
+    parser.add_argument("--lote", type=int, default=100)
+    args = parser.parse_args()
+
+    # AD_TGSPAR sem índice de cidades: CODCID vai com o nome da cidade, como na montagem antiga
+    casos = [
+        (ITENS, valores_antigos_itens, linhas_itens(args.registros)),
+        (CABECALHOS, valores_antigos_pedidos, linhas_pedidos(args.registros)),
+        (PARCEIROS, valores_antigos_clientes, linhas_clientes(args.registros)),
+        (SERIES, valores_antigos_series, linhas_itens_com_series(args.registros)),
+    ]
+    for entidade, valores_antigos, linhas in casos:
+        print(f"[INFO] {entidade.nome}: {args.registros} registros, lotes de {args.lote}")
+        medir("antigo (json.dumps)", lambda: antigo(entidade.nome, entidade.fields, valores_antigos, linhas, args.lote),
+              args.registros)
+        medir("compilado (json)", lambda: compilado(entidade, linhas, args.lote, payload._dumps_json), args.registros)
+        if payload.orjson is not None:
+            medir("compilado (orjson)", lambda: compilado(entidade, linhas, args.lote, payload.dumps), args.registros)
+        else:
+            print("  compilado (orjson)           orjson não instalado")
+
+
+if __name__ == "__main__":
+    main()
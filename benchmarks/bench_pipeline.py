@@ -0,0 +1,216 @@
+"""Benchmark ponta a ponta das etapas TGS* contra o servidor simulado.
+
+Cria (ou recria) as tabelas clientes, pedidos e pedido_itens num banco MySQL
+local de teste, popula N registros, sobe benchmarks/servidor_mock.py numa
+thread, cria os índices de migrar.py e roda TGSMDF, TGSPAR, TGSCAB, TGSITE e
+TGSSER em sequência. Para cada etapa mostra registros/s, latência p50/p99 do DatasetSP.save, chamadas HTTP
+por registro lido e o pico de memória (RSS) do processo.
+
+    docker run -e MARIADB_ROOT_PASSWORD=bench -p 3306:3306 mariadb:11
+    python benchmarks/bench_pipeline.py --mysql-password bench --clientes 2000 --latencia 30
+
+ATENÇÃO: as tabelas do banco informado em --mysql-database são apagadas e
+recriadas. Use só uma instância local de teste. Os arquivos de estado (token,
+lotes, diário, snapshot do IBGE) vão para uma pasta temporária e não tocam os
+do ambiente real.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import servidor_mock  # noqa: E402
+
+TABELAS = {
+    "clientes": """
+        CREATE TABLE clientes (
+            id_cliente INT PRIMARY KEY, nome VARCHAR(120), documento VARCHAR(20), email VARCHAR(120),
+            telefone VARCHAR(20), rua VARCHAR(120), numero VARCHAR(10), cep VARCHAR(10), bairro VARCHAR(60),
+            cidade VARCHAR(60), estado CHAR(2), complemento VARCHAR(60), integrado TINYINT(1) NULL
+        )""",
+    "pedidos": """
+        CREATE TABLE pedidos (
+            id_pedido INT PRIMARY KEY, id_cliente INT, forma_pagamento VARCHAR(30), data_pedido DATE,
+            observacao VARCHAR(200), integrado TINYINT(1) NULL
+        )""",
+    "pedido_itens": """
+        CREATE TABLE pedido_itens (
+            id_item INT PRIMARY KEY, id_pedido INT, id_produto INT, quantidade INT,
+            preco_unitario DECIMAL(12, 2), desconto DECIMAL(12, 2), numeros_serie TEXT,
+            integrado TINYINT(1) NULL, integradoser TINYINT(1) NULL
+        )""",
+}
+
+
+def configurar_ambiente(args, url_mock, pasta):
+    """Aponta os módulos para o servidor simulado e o MySQL de teste antes de importá-los."""
+    os.environ.update({
+        "SANKHYA_AUTH_URL": f"{url_mock}/login",
+        "SANKHYA_API_URL": f"{url_mock}/gateway",
+        "SANKHYA_APP_KEY": "bench", "SANKHYA_AUTH_TOKEN": "bench",
+        "SANKHYA_USERNAME": "bench", "SANKHYA_PASSWORD": "bench",
+        "IBGE_MUNICIPIOS_URL": f"{url_mock}/municipios",
+        "MYSQL_HOST": args.mysql_host,
+        "MYSQL_USER": args.mysql_user,
+        "MYSQL_PASSWORD": args.mysql_password,
+        "MYSQL_DATABASE": args.mysql_database,
+        "SANKHYA_TOKEN_CACHE": os.path.join(pasta, "token.json"),
+        "SANKHYA_LOTE_ARQUIVO": os.path.join(pasta, "lotes.json"),
+        "DIARIO_ARQUIVO": os.path.join(pasta, "diario.db"),
+        "IBGE_SNAPSHOT": os.path.join(pasta, "ibge.json"),
+        "IBGE_INDICE_CIDADES": os.path.join(pasta, "indice.json"),
+    })
+
+
+def popular(args):
+    import mysql.connector
+
+    conn = mysql.connector.connect(host=args.mysql_host, user=args.mysql_user, password=args.mysql_password)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {args.mysql_database}")
+    cursor.execute(f"USE {args.mysql_database}")
+    for tabela, ddl in TABELAS.items():
+        cursor.execute(f"DROP TABLE IF EXISTS {tabela}")
+        cursor.execute(ddl)
+
+    aleatorio = random.Random(42)
+    clientes = [
+        (i, f"Cliente {i}", f"{i:011d}", f"cliente{i}@exemplo.com", "11999990000", "Rua A", str(i % 999),
+         "01000-000", "Centro", f"Municipio {i % 500}", servidor_mock.UFS[(i % 500) % len(servidor_mock.UFS)], None)
+        for i in range(1, args.clientes + 1)
+    ]
+    pedidos, itens = [], []
+    inicio = datetime.date(2024, 1, 1)
+    for p in range(1, args.clientes * args.pedidos_por_cliente + 1):
+        pedidos.append((p, 1 + p % args.clientes, "cartao", inicio + datetime.timedelta(days=p % 365), None))
+        for _ in range(args.itens_por_pedido):
+            i = len(itens) + 1
+            series = [f"SN{i:08d}{s}" for s in range(args.series_por_item)]
+            itens.append((i, p, 1000 + aleatorio.randrange(300), 1 + aleatorio.randrange(5),
+                          f"{aleatorio.uniform(1, 500):.2f}", "0.00", json.dumps(series)))
+
+    for sql, linhas in (
+        ("INSERT INTO clientes (id_cliente, nome, documento, email, telefone, rua, numero, cep, bairro, cidade, "
+         "estado, complemento) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", clientes),
+        ("INSERT INTO pedidos (id_pedido, id_cliente, forma_pagamento, data_pedido, observacao) "
+         "VALUES (%s, %s, %s, %s, %s)", pedidos),
+        ("INSERT INTO pedido_itens (id_item, id_pedido, id_produto, quantidade, preco_unitario, desconto, "
+         "numeros_serie) VALUES (%s, %s, %s, %s, %s, %s, %s)", itens),
+    ):
+        for i in range(0, len(linhas), 1000):
+            cursor.executemany(sql, linhas[i : i + 1000])
+    conn.commit()
+    conn.close()
+    print(f"[INFO] Base populada: {len(clientes)} clientes, {len(pedidos)} pedidos, {len(itens)} itens.")
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def pico_rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024  # bytes no macOS, KB no Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta das etapas TGS* com servidor simulado.")
+    parser.add_argument("--mysql-host", default="127.0.0.1")
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-password", default="")
+    parser.add_argument("--mysql-database", default="integracao_bench")
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--pedidos-por-cliente", type=int, default=2)
+    parser.add_argument("--itens-por-pedido", type=int, default=3)
+    parser.add_argument("--series-por-item", type=int, default=2)
+    parser.add_argument("--municipios", type=int, default=5570)
+    parser.add_argument("--latencia", type=float, default=20, help="ms por DatasetSP.save no servidor simulado")
+    parser.add_argument("--latencia-registro", type=float, default=0.2, help="ms extras por registro")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de requisições com 429/503")
+    parser.add_argument("--taxa-registro-erro", type=float, default=0.001, help="fração de registros recusados")
+    args = parser.parse_args()
+
+    opcoes = servidor_mock.Opcoes(args.latencia / 1000, args.latencia_registro / 1000, args.taxa_erro,
+                                  args.taxa_registro_erro, args.municipios)
+    servidor, url = servidor_mock.iniciar(opcoes=opcoes)
+    pasta = tempfile.mkdtemp(prefix="bench_integracao_")
+    configurar_ambiente(args, url, pasta)
+    popular(args)
+
+    # Importados só agora: leem a configuração do ambiente ao carregar
+    import migrar
+    import sankhya
+    import TGSCAB
+    import TGSITE
+    import TGSMDF
+    import TGSPAR
+    import TGSSER
+
+    migrar.executar()
+
+    latencias = []
+    enviar_payload = sankhya.enviar_payload
+
+    def enviar_cronometrado(*a, **k):
+        inicio = time.perf_counter()
+        try:
+            return enviar_payload(*a, **k)
+        finally:
+            latencias.append(time.perf_counter() - inicio)
+
+    sankhya.enviar_payload = enviar_cronometrado
+
+    etapas = [
+        ("TGSMDF", lambda: TGSMDF.executar(completo=True)),
+        ("TGSPAR", TGSPAR.executar),
+        ("TGSCAB", TGSCAB.executar),
+        ("TGSITE", TGSITE.executar),
+        ("TGSSER", TGSSER.executar),
+    ]
+    resultados = []
+    for nome, funcao in etapas:
+        latencias.clear()
+        antes = servidor.estado.estatisticas()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        segundos = time.perf_counter() - inicio
+        depois = servidor.estado.estatisticas()
+        chamadas = depois["save"] - antes["save"]
+        registros = depois["registros"] - antes["registros"]
+        resultados.append((nome, resultado["lidos"], registros, segundos, chamadas,
+                           percentil(latencias, 50), percentil(latencias, 99), pico_rss_mb()))
+
+    print()
+    print("[RESUMO] Benchmark ponta a ponta")
+    print(f"  {'Etapa':<8} {'Lidos':>8} {'Enviados':>9} {'Tempo':>8} {'Lidos/s':>9} {'HTTP/lido':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    for nome, lidos, enviados, segundos, chamadas, p50, p99, rss in resultados:
+        por_registro = chamadas / lidos if lidos else 0.0
+        rss_texto = f"{rss:.1f}" if rss is not None else "n/d"
+        print(f"  {nome:<8} {lidos:>8} {enviados:>9} {segundos:>7.2f}s {lidos / segundos if segundos else 0:>9.0f} "
+              f"{por_registro:>9.3f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {rss_texto:>8}")
+    print(f"  Servidor: {servidor.estado.estatisticas()}")
+    print(f"  Arquivos de estado em {pasta}")
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
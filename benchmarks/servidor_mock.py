@@ -0,0 +1,174 @@
+"""Servidor local que imita a API Sankhya e o serviço de municípios do IBGE.
+
+Atende, sem acessar a rede:
+    POST /login      -> {"bearerToken": ...}
+    POST /gateway    -> DatasetSP.save, com latência, erros HTTP e status ERROR simulados
+    GET  /municipios -> lista de municípios no formato do IBGE (com ETag / 304)
+    GET  /estatisticas -> contadores de requisições e registros recebidos
+
+    python benchmarks/servidor_mock.py --porta 8099 --latencia 50 --taxa-erro 0.01
+
+e no .env: SANKHYA_AUTH_URL=http://127.0.0.1:8099/login,
+SANKHYA_API_URL=http://127.0.0.1:8099/gateway e
+IBGE_MUNICIPIOS_URL=http://127.0.0.1:8099/municipios.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UFS = ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE",
+       "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"]
+
+
+class Opcoes:
+    def __init__(self, latencia=0.0, latencia_registro=0.0, taxa_erro=0.0, taxa_registro_erro=0.0, municipios=5570):
+        self.latencia = latencia                      # segundos por requisição
+        self.latencia_registro = latencia_registro    # segundos extras por registro do lote
+        self.taxa_erro = taxa_erro                    # fração de requisições com 429/503
+        self.taxa_registro_erro = taxa_registro_erro  # fração de registros recusados (status ERROR)
+        self.municipios = municipios
+
+
+def municipios_ibge(quantidade):
+    """Lista no formato de /api/v1/localidades/municipios, com nomes e UFs determinísticos."""
+    return [
+        {
+            "id": 1100000 + i,
+            "nome": f"Municipio {i}",
+            "microrregiao": {"mesorregiao": {"UF": {"sigla": UFS[i % len(UFS)]}}},
+        }
+        for i in range(quantidade)
+    ]
+
+
+def registro_recusado(values, taxa):
+    # Determinístico pelo conteúdo: o mesmo registro é recusado em todas as tentativas e subdivisões
+    if taxa <= 0:
+        return False
+    return zlib.crc32(json.dumps(values, sort_keys=True).encode("utf-8")) % 10000 < taxa * 10000
+
+
+class Estado:
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.tokens = set()
+        self.contadores = {"login": 0, "save": 0, "registros": 0, "erros_http": 0, "recusados": 0, "municipios": 0}
+        self._lock = threading.Lock()
+        corpo = json.dumps(municipios_ibge(opcoes.municipios), ensure_ascii=False).encode("utf-8")
+        self.municipios_corpo = corpo
+        self.municipios_etag = f'"{hashlib.sha256(corpo).hexdigest()[:16]}"'
+
+    def contar(self, **incrementos):
+        with self._lock:
+            for nome, valor in incrementos.items():
+                self.contadores[nome] += valor
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self.contadores)
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como a API real
+    estado = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, status, corpo=b"", headers=None):
+        if isinstance(corpo, (dict, list)):
+            corpo = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def do_POST(self):
+        corpo = self._ler_corpo()
+        if self.path.startswith("/login"):
+            token = uuid.uuid4().hex
+            self.estado.tokens.add(token)
+            self.estado.contar(login=1)
+            return self._responder(200, {"bearerToken": token})
+        if self.path.startswith("/gateway"):
+            return self._salvar(corpo)
+        self._responder(404, {"erro": "caminho desconhecido"})
+
+    def _salvar(self, corpo):
+        opcoes = self.estado.opcoes
+        autorizacao = self.headers.get("Authorization", "")
+        if autorizacao.removeprefix("Bearer ") not in self.estado.tokens:
+            return self._responder(401, {"erro": "token inválido"})
+        try:
+            registros = json.loads(corpo)["requestBody"]["records"]
+        except (ValueError, KeyError, TypeError):
+            return self._responder(400, {"erro": "payload inválido"})
+
+        self.estado.contar(save=1, registros=len(registros))
+        time.sleep(opcoes.latencia + opcoes.latencia_registro * len(registros))
+        if random.random() < opcoes.taxa_erro:
+            self.estado.contar(erros_http=1)
+            return self._responder(random.choice((429, 503)), {"erro": "indisponível (simulado)"})
+        if any(registro_recusado(r.get("values"), opcoes.taxa_registro_erro) for r in registros):
+            self.estado.contar(recusados=1)
+            return self._responder(200, {"status": "ERROR", "statusMessage": "Registro inválido (simulado)"})
+        self._responder(200, {"status": "1", "responseBody": {"total": len(registros)}})
+
+    def do_GET(self):
+        if self.path.startswith("/municipios"):
+            self.estado.contar(municipios=1)
+            if self.headers.get("If-None-Match") == self.estado.municipios_etag:
+                return self._responder(304, headers={"ETag": self.estado.municipios_etag})
+            return self._responder(200, self.estado.municipios_corpo, {"ETag": self.estado.municipios_etag})
+        if self.path.startswith("/estatisticas"):
+            return self._responder(200, self.estado.estatisticas())
+        self._responder(404, {"erro": "caminho desconhecido"})
+
+
+def iniciar(host="127.0.0.1", porta=0, opcoes=None):
+    """Sobe o servidor numa thread. Retorna (servidor, url_base); servidor.estado guarda os contadores."""
+    estado = Estado(opcoes or Opcoes())
+    manipulador = type("ManipuladorMock", (Manipulador,), {"estado": estado})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    servidor.estado = estado
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API Sankhya e o IBGE.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--latencia", type=float, default=0, help="ms por requisição DatasetSP.save")
+    parser.add_argument("--latencia-registro", type=float, default=0, help="ms extras por registro do lote")
+    parser.add_argument("--taxa-erro", type=float, default=0, help="fração de requisições com 429/503")
+    parser.add_argument("--taxa-registro-erro", type=float, default=0, help="fração de registros com status ERROR")
+    parser.add_argument("--municipios", type=int, default=5570)
+    args = parser.parse_args()
+
+    opcoes = Opcoes(args.latencia / 1000, args.latencia_registro / 1000, args.taxa_erro,
+                    args.taxa_registro_erro, args.municipios)
+    servidor, url = iniciar(args.host, args.porta, opcoes)
+    print(f"[INFO] Servidor simulado em {url} (login, gateway, municipios, estatisticas). Ctrl+C encerra.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import signal
+import threading
+import time
+
+import log
+import metricas
+import pipeline
+
+# Intervalo de consulta adaptativo: cai para o mínimo quando há movimento e
+# dobra a cada ciclo ocioso até o máximo
+INTERVALO_MIN = float(os.getenv("DAEMON_INTERVALO_MIN", "2"))
+INTERVALO_MAX = float(os.getenv("DAEMON_INTERVALO_MAX", "60"))
+# A cada RELEITURA segundos a marca é zerada para reprocessar falhas antigas
+RELEITURA = float(os.getenv("DAEMON_RELEITURA", "900"))
+
+ETAPAS_COM_MARCA = ("TGSPAR", "TGSCAB", "TGSPED", "TGSITE", "TGSSER")
+
+_parar = threading.Event()
+
+
+def _sinal_parada(signum, frame):
+    log.info(f"Sinal {signum} recebido. Encerrando após o ciclo atual...")
+    _parar.set()
+
+
+def proxima_marca(marcas, resultados):
+    """Avança a marca (maior chave lida) de cada etapa concluída."""
+    novas = dict(marcas)
+    for nome, (status, _, resultado) in resultados.items():
+        nome_base = nome.split(" ")[0]
+        if status != "OK" or nome_base not in ETAPAS_COM_MARCA or resultado["ultima_chave"] is None:
+            continue
+        atual = novas.get(nome_base)
+        novas[nome_base] = resultado["ultima_chave"] if atual is None else max(atual, resultado["ultima_chave"])
+    return novas
+
+
+def executar():
+    """Roda o pipeline em ciclos, lendo só as chaves acima da última marca.
+
+    Conexões MySQL, transporte HTTP e token ficam quentes entre os ciclos.
+    Registros que falharam abaixo da marca voltam na releitura completa.
+    """
+    marcas = {}
+    intervalo = INTERVALO_MIN
+    ultima_releitura = time.monotonic()
+
+    while not _parar.is_set():
+        if time.monotonic() - ultima_releitura >= RELEITURA:
+            log.info("Releitura completa dos pendentes.")
+            marcas = {}
+            ultima_releitura = time.monotonic()
+
+        inicio = time.perf_counter()
+        resultados = pipeline.executar(pipeline.montar_etapas(marcas=marcas))
+        lidos = sum(r["lidos"] for status, _, r in resultados.values() if status == "OK")
+        marcas = proxima_marca(marcas, resultados)
+        metricas.gravar()
+
+        if lidos:
+            intervalo = INTERVALO_MIN
+            pipeline.imprimir_resumo(resultados, time.perf_counter() - inicio)
+        else:
+            intervalo = min(INTERVALO_MAX, intervalo * 2)
+
+        _parar.wait(intervalo)
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, _sinal_parada)
+    signal.signal(signal.SIGTERM, _sinal_parada)
+    metricas.iniciar_servidor()
+    log.info(f"Daemon iniciado (intervalo {INTERVALO_MIN:g}s a {INTERVALO_MAX:g}s).")
+    executar()
+    log.info("Daemon encerrado.")
@@ -0,0 +1,108 @@
+import collections
+import os
+import threading
+import time
+
+import log
+import metricas
+
+# Quantidade de envios simultâneos à API Sankhya (1 = sequencial)
+CONCORRENCIA = max(1, int(os.getenv("SANKHYA_CONCORRENCIA", "4")))
+# Tarefas aguardando por worker antes de bloquear a leitura
+FILA_POR_WORKER = 2
+
+_FIM = object()
+
+_fila = metricas.medidor("integracao_fila_despacho", "Tarefas aguardando nas filas dos workers")
+_espera_fila = metricas.histograma("integracao_despacho_espera_segundos", "Tempo que a leitura ficou bloqueada com as filas cheias")
+
+
+class Despachante:
+    """Executa tarefas num pool limitado de workers.
+
+    Tarefas sem chave (lotes) vão para uma fila compartilhada e são pegas pelo
+    primeiro worker livre. Tarefas com chave caem sempre na fila própria do
+    mesmo worker e por isso rodam na ordem em que foram submetidas. As filas
+    são limitadas, então submeter() bloqueia quando há trabalho demais em voo.
+    """
+
+    def __init__(self, workers=CONCORRENCIA):
+        self.workers = workers
+        self._filas = []
+        self._compartilhada = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        if workers <= 1:
+            return
+        for n in range(workers):
+            self._filas.append(collections.deque())
+            thread = threading.Thread(target=self._executar, args=(n,), name=f"despacho-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @staticmethod
+    def _rodar(funcao, args):
+        try:
+            funcao(*args)
+        except Exception as e:
+            log.excecao(f"Tarefa {getattr(funcao, '__name__', funcao)} - Erro: {str(e)}")
+
+    def _tamanho(self):
+        return len(self._compartilhada) + sum(len(fila) for fila in self._filas)
+
+    def _proxima(self, propria):
+        # Prioridade: tarefa da própria fila, depois a compartilhada; o fim só depois que a compartilhada esvaziar
+        if propria and propria[0] is not _FIM:
+            return propria.popleft()
+        if self._compartilhada:
+            return self._compartilhada.popleft()
+        if propria:
+            return propria.popleft()
+        return None
+
+    def _executar(self, n):
+        propria = self._filas[n]
+        while True:
+            with self._cond:
+                tarefa = self._proxima(propria)
+                while tarefa is None:
+                    self._cond.wait()
+                    tarefa = self._proxima(propria)
+                self._cond.notify_all()
+                _fila.definir(self._tamanho())
+            if tarefa is _FIM:
+                return
+            self._rodar(*tarefa)
+
+    def submeter(self, chave, funcao, *args):
+        """Enfileira funcao(*args). chave None: qualquer worker; senão, sempre o mesmo worker da chave."""
+        if not self._filas:
+            self._rodar(funcao, args)
+            return
+        if chave is None:
+            fila, limite = self._compartilhada, FILA_POR_WORKER * self.workers
+        else:
+            fila, limite = self._filas[hash(chave) % self.workers], FILA_POR_WORKER
+        inicio = time.perf_counter()
+        with self._cond:
+            while len(fila) >= limite:
+                self._cond.wait()
+            fila.append((funcao, args))
+            self._cond.notify_all()
+            _fila.definir(self._tamanho())
+        _espera_fila.observar(time.perf_counter() - inicio)
+
+    def aguardar(self):
+        with self._cond:
+            for fila in self._filas:
+                fila.append(_FIM)
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._filas, self._threads = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.aguardar()
@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import log
+from sankhya import salvar_registros
+
+# Diário local (SQLite) do que foi enviado ao Sankhya e marcado no MySQL
+DIARIO_ARQUIVO = os.getenv("DIARIO_ARQUIVO", ".integracao_diario.db")
+RETENCAO_DIAS = float(os.getenv("DIARIO_RETENCAO_DIAS", "7"))
+LIMPEZA_INTERVALO = 3600  # segundos entre limpezas num processo de longa duração (daemon.py)
+
+PENDENTE = "pendente"  # payload gravado, envio ainda não confirmado
+ENVIADO = "enviado"    # aceito pelo Sankhya, falta marcar no MySQL
+MARCADO = "marcado"    # status gravado no MySQL
+
+_instancia = None
+_instancia_lock = threading.Lock()
+
+
+def _codificar(chave):
+    return json.dumps(chave)
+
+
+def _decodificar(texto):
+    valor = json.loads(texto)
+    return tuple(valor) if isinstance(valor, list) else valor
+
+
+def _grupo(chave, grupo):
+    if grupo is None:
+        return chave
+    return grupo(chave) if callable(grupo) else grupo
+
+
+class Diario:
+    """Registro append-only do ciclo de cada registro: pendente -> enviado -> marcado.
+
+    Cada linha guarda a entidade, a chave do registro, o grupo (a chave que é
+    marcada no MySQL; para séries, o id_item) e o payload. Se o processo cair
+    entre o DatasetSP.save e o UPDATE, a próxima execução encontra o registro
+    como 'enviado': não reenvia e só marca. Se o MySQL estiver fora do ar, as
+    marcações ficam acumuladas aqui e são gravadas em lote depois.
+
+    A tabela integrados é o índice permanente (sem retenção) dos valores de
+    deduplicação já aceitos: documento normalizado dos parceiros, id_pedido,
+    id_item. Com chave primária WITHOUT ROWID, cada consulta é uma busca na
+    árvore B e continua rápida com milhões de linhas.
+    """
+
+    def __init__(self, arquivo=DIARIO_ARQUIVO):
+        self._conn = sqlite3.connect(arquivo, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS registros (
+                    entidade TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    grupo TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    payload TEXT,
+                    atualizado_em REAL NOT NULL,
+                    PRIMARY KEY (entidade, chave)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_registros_grupo ON registros (entidade, grupo)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS integrados (
+                    entidade TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    PRIMARY KEY (entidade, valor)
+                ) WITHOUT ROWID
+            """)
+        self.limpar()
+
+    def limpar(self):
+        """Apaga do diário o que passou de DIARIO_RETENCAO_DIAS: marcados e grupos com pendentes antigos."""
+        limite = time.time() - RETENCAO_DIAS * 86400
+        with self._lock, self._conn:
+            # Pendentes antigos são envios que falharam e não voltaram a ser lidos. Sai o grupo
+            # inteiro, para que os enviados restantes não sejam marcados com uma série faltando;
+            # o MySQL continua sem a marcação e a próxima leitura reenvia tudo
+            self._conn.execute(
+                "DELETE FROM registros WHERE (entidade, grupo) IN "
+                "(SELECT entidade, grupo FROM registros WHERE estado = ? AND atualizado_em < ?)",
+                (PENDENTE, limite),
+            )
+            self._conn.execute("DELETE FROM registros WHERE estado = ? AND atualizado_em < ?", (MARCADO, limite))
+            self._ultima_limpeza = time.monotonic()
+
+    def limpar_periodicamente(self):
+        """limpar() se a última foi há mais de LIMPEZA_INTERVALO segundos; chamado a cada ciclo de sincronização."""
+        if time.monotonic() - self._ultima_limpeza >= LIMPEZA_INTERVALO:
+            self.limpar()
+
+    def registrar_pendentes(self, entidade, itens, grupo=None):
+        """Grava [(chave, values), ...] antes do envio. Sem grupo, cada chave é o seu grupo.
+
+        grupo pode ser um valor fixo ou uma função chave -> grupo (lotes com
+        registros de vários grupos). Registros já aceitos pelo Sankhya não
+        voltam a pendente.
+        """
+        agora = time.time()
+        linhas = [
+            (entidade, _codificar(chave), _codificar(_grupo(chave, grupo)), PENDENTE, json.dumps(values, default=str), agora)
+            for chave, values in itens
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO registros (entidade, chave, grupo, estado, payload, atualizado_em) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (entidade, chave) DO UPDATE SET grupo = excluded.grupo, estado = excluded.estado, "
+                "payload = excluded.payload, atualizado_em = excluded.atualizado_em WHERE registros.estado != ?",
+                [linha + (ENVIADO,) for linha in linhas],
+            )
+
+    def registrar_enviados(self, entidade, chaves):
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE registros SET estado = ?, atualizado_em = ? WHERE entidade = ? AND chave = ?",
+                [(ENVIADO, agora, entidade, _codificar(c)) for c in chaves],
+            )
+
+    def registrar_marcados(self, entidade, grupos):
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE registros SET estado = ?, atualizado_em = ? WHERE entidade = ? AND grupo = ?",
+                [(MARCADO, agora, entidade, _codificar(g)) for g in grupos],
+            )
+
+    def ja_enviados(self, entidade, chaves):
+        """Subconjunto de chaves já aceitas pelo Sankhya e ainda não marcadas."""
+        codificadas = [_codificar(c) for c in chaves]
+        encontrados = set()
+        with self._lock:
+            for inicio in range(0, len(codificadas), 500):
+                bloco = codificadas[inicio : inicio + 500]
+                marcadores = ", ".join("?" * len(bloco))
+                cursor = self._conn.execute(
+                    f"SELECT chave FROM registros WHERE entidade = ? AND estado = ? AND chave IN ({marcadores})",
+                    (entidade, ENVIADO, *bloco),
+                )
+                encontrados.update(_decodificar(linha[0]) for linha in cursor)
+        return encontrados
+
+    def ja_integrados(self, entidade, valores):
+        """Subconjunto de valores de deduplicação já aceitos pelo Sankhya em qualquer execução."""
+        valores = [str(v) for v in valores]
+        encontrados = set()
+        with self._lock:
+            for inicio in range(0, len(valores), 500):
+                bloco = valores[inicio : inicio + 500]
+                marcadores = ", ".join("?" * len(bloco))
+                cursor = self._conn.execute(
+                    f"SELECT valor FROM integrados WHERE entidade = ? AND valor IN ({marcadores})",
+                    (entidade, *bloco),
+                )
+                encontrados.update(linha[0] for linha in cursor)
+        return encontrados
+
+    def registrar_integrados(self, entidade, valores):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO integrados (entidade, valor) VALUES (?, ?)",
+                [(entidade, str(v)) for v in valores],
+            )
+
+    def grupos_a_marcar(self, entidade):
+        """Grupos com todos os registros aceitos pelo Sankhya e ainda não marcados no MySQL."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT grupo FROM registros WHERE entidade = ? GROUP BY grupo HAVING SUM(estado != ?) = 0",
+                (entidade, ENVIADO),
+            )
+            return [_decodificar(linha[0]) for linha in cursor]
+
+
+def obter_diario():
+    global _instancia
+    with _instancia_lock:
+        if _instancia is None:
+            _instancia = Diario()
+        return _instancia
+
+
+def salvar_com_diario(entidade, fields, itens, grupo=None, reservar=None):
+    """salvar_registros passando pelo diário.
+
+    Registros já aceitos numa execução anterior não são reenviados e voltam
+    direto como sucesso. Os demais são gravados como pendentes, enviados e,
+    se aceitos, promovidos a enviados. reservar segue para salvar_registros.
+    Retorna (sucessos, falhas).
+    """
+    diario = obter_diario()
+    ja_enviados = diario.ja_enviados(entidade, [chave for chave, _ in itens])
+    novos = [(chave, values) for chave, values in itens if chave not in ja_enviados]
+    sucessos, falhas = [], []
+    if novos:
+        diario.registrar_pendentes(entidade, novos, grupo)
+        sucessos, falhas = salvar_registros(entidade, fields, novos, reservar)
+        diario.registrar_enviados(entidade, sucessos)
+    return [chave for chave, _ in itens if chave in ja_enviados] + sucessos, falhas
+
+
+def retomar_marcacoes(entidade, marcador):
+    """Entrega ao marcador os grupos que ficaram enviados e não marcados numa execução anterior."""
+    grupos = obter_diario().grupos_a_marcar(entidade)
+    if grupos:
+        log.info(f"{entidade}: {len(grupos)} registros já enviados aguardando marcação no MySQL.")
+        marcador.marcar(grupos)
@@ -0,0 +1,194 @@
+import json
+import re
+
+import log
+from municipios import IndiceCidades
+from payload import compilar_campos, data, decimal
+
+
+class Entidade:
+    """Definição de uma entidade sincronizada MySQL -> Sankhya.
+
+    campos é a lista (FIELD do Sankhya, origem), na ordem do payload; a origem
+    é o nome de uma coluna do SELECT ou uma função (linha, contexto) -> valor.
+    preparar() roda uma vez por execução e devolve o contexto passado a essas
+    funções. Sem registros, cada linha vira um registro e vai em lotes; com
+    registros(linha, contexto) -> [(chave, values), ...], cada linha vira um
+    grupo enviado junto e só marcado quando todos os registros forem aceitos.
+    deduplicar é a coluna usada para pular repetidos dentro da execução,
+    normalizada por normalizar(valor) (vazio não deduplica); com
+    dedup_persistente, valores já aceitos em execuções anteriores (índice
+    integrados do diário) também são pulados, sem chamada HTTP. dedup_sql é a
+    mesma normalização como expressão SQL: os repetidos entre os pendentes são
+    marcados no MySQL numa única instrução, antes da leitura.
+    fechar_lote(contexto), se definido, roda a cada lote montado, antes do
+    envio: avisos por registro são resumidos ali numa linha por lote.
+    """
+
+    def __init__(self, nome, tabela, chave, colunas, campos, rotulo, coluna_status="integrado",
+                 filtro=None, deduplicar=None, normalizar=None, dedup_sql=None, dedup_persistente=False,
+                 preparar=None, registros=None, fechar_lote=None):
+        self.nome = nome
+        self.tabela = tabela
+        self.chave = chave
+        self.colunas = tuple(colunas)
+        self.campos = tuple(campos)
+        self.fields = [field for field, _ in self.campos]
+        # valores(linha, contexto=None) -> values do DatasetSP.save ({"0": ..., "1": ..., ...}).
+        # Atributo, não método: a função compilada é chamada direto, sem um nível extra por registro
+        self.valores = compilar_campos(self.campos)
+        self.rotulo = rotulo
+        self.coluna_status = coluna_status
+        self.filtro = filtro or f"{coluna_status} is null"
+        self.deduplicar = deduplicar or chave
+        self.normalizar = normalizar
+        self.dedup_sql = dedup_sql
+        self.dedup_persistente = dedup_persistente
+        self.preparar = preparar
+        self.registros = registros
+        self.fechar_lote = fechar_lote
+
+    @property
+    def indice(self):
+        """Colunas do índice que torna a busca dos pendentes uma leitura de intervalo."""
+        return (self.coluna_status, self.chave)
+
+    @property
+    def select(self):
+        return f"SELECT {', '.join(self.colunas)} FROM {self.tabela}"
+
+    def valor_dedup(self, linha):
+        """Valor normalizado da coluna de deduplicação, ou None se vazio."""
+        valor = linha[self.deduplicar]
+        if self.normalizar is not None:
+            valor = self.normalizar(valor)
+        return None if valor is None or valor == "" else valor
+
+
+# --- PARCEIROS (AD_TGSPAR) ---
+def normalizar_documento(documento):
+    """CPF/CNPJ só com dígitos: "123.456.789-09" e "12345678909" são o mesmo parceiro."""
+    return re.sub(r"\D", "", str(documento)) if documento is not None else None
+
+
+class CidadesDoLote:
+    """Contexto do AD_TGSPAR: o índice de cidades e quantos clientes do lote atual ficaram sem código IBGE."""
+
+    def __init__(self, indice):
+        self.indice = indice
+        self.sem_codigo = 0
+
+
+def carregar_indice_cidades():
+    indice = IndiceCidades.carregar()
+    if indice is None:
+        log.aviso("Índice de cidades do IBGE não encontrado (rode TGSMDF.py). CODCID irá com o nome da cidade.")
+    return CidadesDoLote(indice)
+
+
+def codigo_cidade(cliente, cidades):
+    """Código IBGE de cidade/estado do cliente; sem correspondência, mantém o texto original."""
+    indice = cidades.indice if cidades else None
+    codigo = indice.resolver(cliente["cidade"], cliente["estado"]) if indice else None
+    if codigo is None:
+        if indice:
+            cidades.sem_codigo += 1
+            log.debug("Cliente %s - cidade '%s/%s' sem código IBGE.", cliente["id_cliente"], cliente["cidade"],
+                      cliente["estado"])
+        return cliente["cidade"]
+    return codigo
+
+
+def resumir_cidades(cidades):
+    """Um aviso por lote com o total de clientes sem código IBGE; o detalhe de cada um fica em debug."""
+    if cidades and cidades.sem_codigo:
+        log.aviso(f"{cidades.sem_codigo} clientes do lote com cidade sem código IBGE. CODCID irá com o nome da cidade.",
+                  entidade="AD_TGSPAR", sem_codigo=cidades.sem_codigo)
+        cidades.sem_codigo = 0
+
+
+PARCEIROS = Entidade(
+    "AD_TGSPAR", tabela="clientes", chave="id_cliente", rotulo="Cliente",
+    deduplicar="documento", normalizar=normalizar_documento, dedup_persistente=True,
+    dedup_sql="REGEXP_REPLACE(documento, '[^0-9]', '')",
+    colunas=["id_cliente", "nome", "documento", "email", "telefone", "rua", "numero", "cep", "bairro",
+             "cidade", "estado", "complemento"],
+    campos=[
+        ("ID", "id_cliente"),
+        ("RAZAOSOCIAL", "nome"),
+        ("DOCUMENTO", "documento"),
+        ("EMAIL", "email"),
+        ("TELEFONE", "telefone"),
+        ("ENDERECO", "rua"),
+        ("NUMERO", "numero"),
+        ("CEP", "cep"),
+        ("BAIRRO", "bairro"),
+        ("CODCID", codigo_cidade),
+        ("SIGLA", "estado"),
+        ("COMPLEMENTO", "complemento"),
+    ],
+    preparar=carregar_indice_cidades,
+    fechar_lote=resumir_cidades,
+)
+
+
+# --- CABEÇALHOS DE PEDIDO (AD_TGSCAB) ---
+CABECALHOS = Entidade(
+    "AD_TGSCAB", tabela="pedidos", chave="id_pedido", rotulo="Pedido", dedup_persistente=True,
+    colunas=["id_pedido", "id_cliente", "forma_pagamento", "data_pedido", "observacao"],
+    campos=[
+        ("NUPED", "id_pedido"),
+        ("ID", "id_cliente"),
+        ("PGTO", "forma_pagamento"),
+        ("DTPED", data("data_pedido")),
+        ("OBSERVACAO", "observacao"),
+    ],
+)
+
+
+# --- ITENS DE PEDIDO (AD_TGSITE) ---
+ITENS = Entidade(
+    "AD_TGSITE", tabela="pedido_itens", chave="id_item", rotulo="ItemPedido", dedup_persistente=True,
+    colunas=["id_item", "id_pedido", "id_produto", "quantidade", "preco_unitario", "desconto"],
+    campos=[
+        ("IDITEM", "id_item"),
+        ("NUPED", "id_pedido"),
+        ("QTDNEG", "quantidade"),
+        ("VLRUNIT", decimal("preco_unitario")),
+        ("DESCONTO", decimal("desconto")),
+        ("CODPROD", "id_produto"),
+    ],
+)
+
+
+# --- NÚMEROS DE SÉRIE DOS ITENS (AD_TGSSER) ---
+def series_do_item(pedido_iten, contexto):
+    """Um registro por número de série do item; a chave é (id_item, série)."""
+    try:
+        series = json.loads(pedido_iten["numeros_serie"])
+        if not isinstance(series, list):
+            raise ValueError("Formato inválido: esperado array JSON.")
+    except Exception as e:
+        raise ValueError(f"Falha ao interpretar números de série: {str(e)}")
+    # Uma cópia da linha por item, não por série: valores() monta um dict novo a cada chamada
+    linha, id_item, valores = dict(pedido_iten), pedido_iten["id_item"], SERIES.valores
+    registros = []
+    for serie in series:
+        linha["serie"] = serie
+        registros.append(((id_item, serie), valores(linha)))
+    return registros
+
+
+SERIES = Entidade(
+    "AD_TGSSER", tabela="pedido_itens", chave="id_item", rotulo="ItemPedido", coluna_status="integradoser",
+    colunas=["id_item", "id_pedido", "numeros_serie"],
+    campos=[
+        ("IDITEM", "id_item"),
+        ("NUPED", "id_pedido"),
+        ("SERIE", "serie"),
+    ],
+    registros=series_do_item,
+)
+
+
+ENTIDADES = {e.nome: e for e in (PARCEIROS, CABECALHOS, ITENS, SERIES)}
@@ -0,0 +1,109 @@
+import codecs
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_decodificador = json.JSONDecoder()
+_ESPACOS = " \t\r\n"
+_SEPARADORES = _ESPACOS + ","
+_CONTINUACAO_NUMERO = frozenset("0123456789.eE+-")
+
+
+class _ArquivoPedacos:
+    """Objeto tipo arquivo (read) sobre um iterável de pedaços de bytes, para o ijson."""
+
+    def __init__(self, pedacos):
+        self._pedacos = iter(pedacos)
+        self._resto = b""
+
+    def read(self, tamanho=-1):
+        if tamanho is None or tamanho < 0:
+            dados, self._resto = self._resto + b"".join(self._pedacos), b""
+            return dados
+        while len(self._resto) < tamanho:
+            pedaco = next(self._pedacos, None)
+            if pedaco is None:
+                break
+            self._resto += pedaco
+        dados, self._resto = self._resto[:tamanho], self._resto[tamanho:]
+        return dados
+
+
+def _itens_raw_decode(pedacos):
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    pedacos = iter(pedacos)
+    buffer, pos = "", 0
+    abriu, fim_dados = False, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARADORES:
+            pos += 1
+        if pos < len(buffer):
+            if not abriu:
+                if buffer[pos] != "[":
+                    raise ValueError("Resposta JSON não é uma lista.")
+                abriu = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, fim = _decodificador.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Elemento incompleto: espera o próximo pedaço (ou falha se acabou)
+                if fim_dados:
+                    raise
+            else:
+                # O elemento só está completo se vier seguido de "," ou "]": terminar no fim do
+                # buffer, ou antes de ".", "e" etc., pode ser um número cortado entre dois pedaços
+                seguinte = fim
+                while seguinte < len(buffer) and buffer[seguinte] in _ESPACOS:
+                    seguinte += 1
+                if seguinte < len(buffer) and buffer[seguinte] in ",]" or seguinte == len(buffer) and fim_dados:
+                    yield item
+                    pos = fim
+                    continue
+                if fim_dados or not _CONTINUACAO_NUMERO.issuperset(buffer[seguinte:]):
+                    raise ValueError("JSON inválido: esperava ',' ou ']' após um elemento da lista.")
+        if fim_dados:
+            raise ValueError("JSON incompleto: a lista não foi fechada.")
+
+        # Só o elemento em andamento fica no buffer
+        pedaco = next(pedacos, None)
+        if pedaco is None:
+            fim_dados = True
+            buffer = buffer[pos:] + utf8.decode(b"", final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(pedaco)
+        pos = 0
+
+
+def itens_json(pedacos):
+    """Gera um a um os elementos de um array JSON recebido em pedaços de bytes.
+
+    A memória fica limitada a um pedaço mais o elemento em andamento, qualquer
+    que seja o tamanho da lista. Usa o ijson se estiver instalado; senão,
+    json.JSONDecoder.raw_decode sobre um buffer que descarta o que já foi lido.
+    """
+    if ijson is not None:
+        yield from ijson.items(_ArquivoPedacos(pedacos), "item", use_float=True)
+        return
+    yield from _itens_raw_decode(pedacos)
+
+
+def registros_json(pedacos, converter):
+    """Elementos do array convertidos por converter(item); itens convertidos em None são descartados.
+
+    Junto com sankhya.fatiar_lotes, que aceita geradores, forma o caminho de
+    carga de dados de referência em memória constante:
+
+        with transporte.fluxo(url) as (r, pedacos):
+            for lote in fatiar_lotes(entidade, registros_json(pedacos, converter)):
+                salvar_registros(entidade, fields, lote)
+    """
+    for item in itens_json(pedacos):
+        registro = converter(item)
+        if registro is not None:
+            yield registro
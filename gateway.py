@@ -0,0 +1,190 @@
+import collections
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+
+import log
+import metricas
+
+load_dotenv()
+
+# Limites de vazão para a API Sankhya (0 desliga)
+TAXA_REQUISICOES = float(os.getenv("SANKHYA_TAXA_REQ", "10"))          # requisições por segundo
+TAXA_BYTES = float(os.getenv("SANKHYA_TAXA_BYTES", "0"))               # bytes por segundo
+# Novas tentativas em 429/5xx/timeout, com espera exponencial e jitter
+RETENTATIVAS = int(os.getenv("SANKHYA_RETENTATIVAS", "3"))
+BACKOFF_BASE = float(os.getenv("SANKHYA_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("SANKHYA_BACKOFF_MAX", "30"))
+# Disjuntor: pausa o envio quando a taxa de erro passa do limite
+DISJUNTOR_LIMITE = float(os.getenv("SANKHYA_DISJUNTOR_LIMITE", "0.5"))
+DISJUNTOR_JANELA = int(os.getenv("SANKHYA_DISJUNTOR_JANELA", "20"))
+DISJUNTOR_PAUSA = float(os.getenv("SANKHYA_DISJUNTOR_PAUSA", "30"))
+
+_tempo_http = metricas.histograma("integracao_http_segundos", "Latência de cada requisição à API Sankhya, por status")
+_retentativas = metricas.contador("integracao_http_retentativas_total", "Novas tentativas após 429/5xx/erro de rede")
+_espera_limite = metricas.histograma("integracao_limitador_espera_segundos", "Tempo aguardando o limite de taxa")
+_disjuntor_aberto = metricas.medidor("integracao_disjuntor_aberto", "1 enquanto o disjuntor da API Sankhya está aberto")
+
+
+class LimitadorTaxa:
+    """Token bucket: aguardar(n) bloqueia até haver n fichas (taxa por segundo, rajada = 1s)."""
+
+    def __init__(self, taxa):
+        self.taxa = taxa
+        self.capacidade = taxa
+        self._fichas = taxa
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self, quantidade=1):
+        if self.taxa <= 0:
+            return
+        quantidade = min(quantidade, self.capacidade)
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= quantidade:
+                    self._fichas -= quantidade
+                    return
+                espera = (quantidade - self._fichas) / self.taxa
+            time.sleep(espera)
+
+
+class Disjuntor:
+    """Circuit breaker sobre as últimas DISJUNTOR_JANELA requisições.
+
+    Fechado: tudo passa. Quando a fração de falhas na janela atinge o limite,
+    abre e segura todos os envios por DISJUNTOR_PAUSA segundos. Depois deixa
+    passar uma requisição de teste (semiaberto): sucesso fecha, falha reabre.
+    """
+
+    FECHADO, ABERTO, SEMIABERTO = "fechado", "aberto", "semiaberto"
+
+    def __init__(self, limite=DISJUNTOR_LIMITE, janela=DISJUNTOR_JANELA, pausa=DISJUNTOR_PAUSA):
+        self.limite = limite
+        self.pausa = pausa
+        self.estado = self.FECHADO
+        self._resultados = collections.deque(maxlen=janela)
+        self._reabre_em = 0.0
+        self._teste_em_curso = False
+        self._cond = threading.Condition()
+
+    def aguardar(self):
+        with self._cond:
+            while True:
+                if self.estado == self.FECHADO:
+                    return
+                if self.estado == self.ABERTO:
+                    restante = self._reabre_em - time.monotonic()
+                    if restante > 0:
+                        self._cond.wait(restante)
+                        continue
+                    self.estado = self.SEMIABERTO
+                if not self._teste_em_curso:
+                    self._teste_em_curso = True
+                    return
+                self._cond.wait()
+
+    def registrar(self, sucesso):
+        with self._cond:
+            if self.estado == self.SEMIABERTO:
+                self._teste_em_curso = False
+                if sucesso:
+                    log.info("Disjuntor fechado: API Sankhya respondendo novamente.")
+                    self.estado = self.FECHADO
+                    _disjuntor_aberto.definir(0)
+                    self._resultados.clear()
+                else:
+                    self._abrir()
+                self._cond.notify_all()
+                return
+
+            self._resultados.append(sucesso)
+            falhas = self._resultados.count(False)
+            if (self.estado == self.FECHADO and len(self._resultados) == self._resultados.maxlen
+                    and falhas / len(self._resultados) >= self.limite):
+                self._abrir()
+
+    def _abrir(self):
+        log.aviso(f"Disjuntor aberto: muitas falhas na API Sankhya. Pausando envios por {self.pausa:g}s.")
+        self.estado = self.ABERTO
+        _disjuntor_aberto.definir(1)
+        self._reabre_em = time.monotonic() + self.pausa
+
+
+def espera_backoff(tentativa, retry_after=None):
+    """Espera exponencial com jitter completo; respeita Retry-After (segundos) quando vier."""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+
+def falha_temporaria(response):
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class Gateway:
+    """Ponto único de saída para a API Sankhya: limite de taxa, novas tentativas e disjuntor."""
+
+    def __init__(self):
+        self.limitador_requisicoes = LimitadorTaxa(TAXA_REQUISICOES)
+        self.limitador_bytes = LimitadorTaxa(TAXA_BYTES)
+        self.disjuntor = Disjuntor()
+
+    def executar(self, requisicao, tamanho=0, ao_tentar=None, antes_de_tentar=None):
+        """Chama requisicao() até RETENTATIVAS vezes extras e devolve a resposta final.
+
+        Exceções de rede e respostas 429/5xx contam como falha no disjuntor e
+        geram nova tentativa; na última, a exceção é relançada ou a resposta
+        de erro é devolvida ao chamador. ao_tentar(segundos, falha), se
+        informado, recebe a latência e o resultado de cada tentativa, sem as
+        esperas do limitador, do disjuntor e do backoff. antes_de_tentar(),
+        se informado, roda depois dessas esperas e imediatamente antes de cada
+        tentativa; uma exceção lançada por ele cancela o envio sem nova tentativa.
+        """
+        for tentativa in range(RETENTATIVAS + 1):
+            self.disjuntor.aguardar()
+            with _espera_limite.cronometrar():
+                self.limitador_requisicoes.aguardar(1)
+                self.limitador_bytes.aguardar(tamanho)
+            if antes_de_tentar:
+                antes_de_tentar()
+            if tentativa:
+                _retentativas.inc()
+            inicio = time.perf_counter()
+            try:
+                response = requisicao()
+            except Exception as e:
+                segundos = time.perf_counter() - inicio
+                _tempo_http.observar(segundos, status="erro")
+                if ao_tentar:
+                    ao_tentar(segundos, True)
+                self.disjuntor.registrar(False)
+                if tentativa == RETENTATIVAS:
+                    raise
+                espera = espera_backoff(tentativa)
+                log.aviso(f"Falha de rede na API Sankhya ({str(e)}). Nova tentativa em {espera:.1f}s...")
+            else:
+                segundos = time.perf_counter() - inicio
+                _tempo_http.observar(segundos, status=str(response.status_code))
+                if ao_tentar:
+                    ao_tentar(segundos, falha_temporaria(response))
+                if not falha_temporaria(response):
+                    self.disjuntor.registrar(True)
+                    return response
+                self.disjuntor.registrar(False)
+                if tentativa == RETENTATIVAS:
+                    return response
+                espera = espera_backoff(tentativa, response.headers.get("Retry-After"))
+                log.aviso(f"API Sankhya respondeu {response.status_code}. Nova tentativa em {espera:.1f}s...")
+            time.sleep(espera)
+
+
+gateway = Gateway()
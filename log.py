@@ -0,0 +1,141 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Nível mínimo: DEBUG inclui uma linha por registro enviado; INFO só resumos por lote e erros
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+# Arquivo com rotação (vazio = só console); em JSON lines por padrão
+LOG_ARQUIVO = os.getenv("LOG_ARQUIVO", "")
+LOG_JSON = os.getenv("LOG_JSON", "1") == "1"
+LOG_ARQUIVO_MAX_MB = float(os.getenv("LOG_ARQUIVO_MAX_MB", "10"))
+LOG_ARQUIVO_BACKUPS = int(os.getenv("LOG_ARQUIVO_BACKUPS", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") == "1"
+
+_logger = logging.getLogger("integracao")
+_ouvinte = None
+
+
+class FormatoTexto(logging.Formatter):
+    """Mesmo formato dos prints de antes: "[OK] mensagem" (com data e hora se datado)."""
+
+    def __init__(self, datado=False):
+        super().__init__()
+        self.datado = datado
+
+    def format(self, record):
+        texto = record.getMessage()
+        etiqueta = getattr(record, "etiqueta", None)
+        if etiqueta:
+            texto = f"[{etiqueta}] {texto}"
+        if self.datado:
+            texto = f"{datetime.datetime.fromtimestamp(record.created):%Y-%m-%d %H:%M:%S} {texto}"
+        return texto
+
+
+class FormatoJson(logging.Formatter):
+    """Uma linha JSON por evento, com os campos extras passados na chamada."""
+
+    def format(self, record):
+        evento = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "etiqueta": getattr(record, "etiqueta", None),
+            "mensagem": record.getMessage(),
+            "thread": record.threadName,
+        }
+        evento.update(getattr(record, "campos", None) or {})
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def configurar(nivel=LOG_NIVEL, arquivo=LOG_ARQUIVO, console=LOG_CONSOLE):
+    """Liga o logger "integracao" a uma fila; uma thread de fundo grava no console e no arquivo.
+
+    Quem registra só enfileira o evento, sem esperar pela escrita (nem pela
+    rotação do arquivo). Chamadas repetidas substituem a configuração anterior.
+    """
+    global _ouvinte
+    encerrar()
+    destinos = []
+    if console:
+        saida = logging.StreamHandler(sys.stdout)
+        saida.setFormatter(FormatoTexto())
+        destinos.append(saida)
+    if arquivo:
+        rotativo = logging.handlers.RotatingFileHandler(
+            arquivo, maxBytes=int(LOG_ARQUIVO_MAX_MB * 1024 * 1024), backupCount=LOG_ARQUIVO_BACKUPS, encoding="utf-8"
+        )
+        rotativo.setFormatter(FormatoJson() if LOG_JSON else FormatoTexto(datado=True))
+        destinos.append(rotativo)
+
+    fila = queue.SimpleQueue()
+    _logger.handlers = [logging.handlers.QueueHandler(fila)]
+    _logger.setLevel(getattr(logging, nivel, logging.INFO))
+    _logger.propagate = False
+    _ouvinte = logging.handlers.QueueListener(fila, *destinos)
+    _ouvinte.start()
+
+
+def encerrar():
+    """Grava o que ainda está na fila e para a thread de escrita."""
+    global _ouvinte
+    if _ouvinte is not None:
+        _ouvinte.stop()
+        _ouvinte = None
+
+
+def depurando():
+    """True com LOG_NIVEL=DEBUG: permite evitar montar mensagens por registro à toa."""
+    return _logger.isEnabledFor(logging.DEBUG)
+
+
+def _registrar(nivel, etiqueta, mensagem, args, campos):
+    if _logger.isEnabledFor(nivel):
+        _logger.log(nivel, mensagem, *args, extra={"etiqueta": etiqueta, "campos": campos})
+
+
+def debug(mensagem, *args, **campos):
+    _registrar(logging.DEBUG, "DEBUG", mensagem, args, campos)
+
+
+def info(mensagem, *args, **campos):
+    _registrar(logging.INFO, "INFO", mensagem, args, campos)
+
+
+def ok(mensagem, *args, **campos):
+    _registrar(logging.INFO, "OK", mensagem, args, campos)
+
+
+def skip(mensagem, *args, **campos):
+    _registrar(logging.INFO, "SKIP", mensagem, args, campos)
+
+
+def resumo(mensagem, *args, **campos):
+    _registrar(logging.INFO, "RESUMO", mensagem, args, campos)
+
+
+def aviso(mensagem, *args, **campos):
+    _registrar(logging.WARNING, "AVISO", mensagem, args, campos)
+
+
+def erro(mensagem, *args, **campos):
+    _registrar(logging.ERROR, "ERRO", mensagem, args, campos)
+
+
+def excecao(mensagem, *args, **campos):
+    _registrar(logging.ERROR, "EXCEÇÃO", mensagem, args, campos)
+
+
+def fatal(mensagem, *args, **campos):
+    _registrar(logging.CRITICAL, "FATAL", mensagem, args, campos)
+
+
+configurar()
+atexit.register(encerrar)
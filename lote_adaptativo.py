@@ -0,0 +1,108 @@
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+
+import log
+
+# Tamanho de lote aprendido por entidade (AIMD), persistido entre execuções
+ADAPTATIVO = os.getenv("SANKHYA_LOTE_ADAPTATIVO", "1") == "1"
+LOTE_MIN = max(1, int(os.getenv("SANKHYA_LOTE_MIN", "1")))
+LOTE_MAX = max(LOTE_MIN, int(os.getenv("SANKHYA_LOTE_MAX", "1000")))
+LOTE_INCREMENTO = max(1, int(os.getenv("SANKHYA_LOTE_INCREMENTO", "10")))
+LATENCIA_ALVO = float(os.getenv("SANKHYA_LOTE_LATENCIA_ALVO", "10"))  # segundos por requisição
+BYTES_MAX = int(os.getenv("SANKHYA_LOTE_BYTES_MAX", str(2 * 1024 * 1024)))
+ARQUIVO = os.getenv("SANKHYA_LOTE_ARQUIVO", ".sankhya_lotes.json")
+INTERVALO_GRAVACAO = 30  # segundos entre gravações do arquivo durante a execução
+
+_controladores = {}
+_lock = threading.Lock()
+_ultima_gravacao = time.monotonic()
+
+
+class ControladorLote:
+    """Ajusta o tamanho do lote de uma entidade pelo que a API aguenta.
+
+    Aumento aditivo (+SANKHYA_LOTE_INCREMENTO) quando a requisição volta
+    dentro da latência alvo e do limite de bytes; redução multiplicativa
+    (metade) em timeout, 429/5xx ou resposta lenta. Recusas de dados
+    (status ERROR) não mexem no tamanho: são problema do registro, não do lote.
+    """
+
+    def __init__(self, entidade, inicial):
+        self.entidade = entidade
+        self._tamanho = float(min(LOTE_MAX, max(LOTE_MIN, inicial)))
+        self._lock = threading.Lock()
+
+    @property
+    def tamanho(self):
+        return int(self._tamanho)
+
+    def registrar(self, registros, segundos, bytes_enviados, falha_transporte):
+        if not ADAPTATIVO:
+            return
+        with self._lock:
+            if falha_transporte or segundos > LATENCIA_ALVO or bytes_enviados > BYTES_MAX:
+                # Só reduz se o lote que falhou era do tamanho atual (evita cortes em cascata)
+                if registros >= self.tamanho // 2:
+                    self._tamanho = max(LOTE_MIN, self._tamanho / 2)
+            elif registros >= self.tamanho:
+                self._tamanho = min(LOTE_MAX, self._tamanho + LOTE_INCREMENTO)
+        _gravar_periodicamente()
+
+    def fatiar(self, itens):
+        """Divide itens em lotes, relendo o tamanho atual a cada fatia.
+
+        Aceita qualquer iterável (inclusive geradores): só a fatia atual fica
+        em memória.
+        """
+        iterador = iter(itens)
+        while True:
+            lote = list(itertools.islice(iterador, self.tamanho))
+            if not lote:
+                return
+            yield lote
+
+
+def _ler():
+    try:
+        with open(ARQUIVO, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def controlador(entidade, inicial):
+    """Controlador da entidade, partindo do tamanho salvo na última execução (ou de inicial)."""
+    with _lock:
+        if entidade not in _controladores:
+            salvo = _ler().get(entidade) if ADAPTATIVO else None
+            _controladores[entidade] = ControladorLote(entidade, salvo or inicial)
+        return _controladores[entidade]
+
+
+def gravar():
+    global _ultima_gravacao
+    if not ADAPTATIVO or not ARQUIVO:
+        return
+    with _lock:
+        dados = _ler()
+        dados.update({entidade: c.tamanho for entidade, c in _controladores.items()})
+        _ultima_gravacao = time.monotonic()
+        try:
+            tmp = f"{ARQUIVO}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dados, f, indent=2, sort_keys=True)
+            os.replace(tmp, ARQUIVO)
+        except OSError as e:
+            log.aviso(f"Não foi possível gravar os tamanhos de lote: {str(e)}")
+
+
+def _gravar_periodicamente():
+    if time.monotonic() - _ultima_gravacao >= INTERVALO_GRAVACAO:
+        gravar()
+
+
+atexit.register(gravar)
@@ -0,0 +1,215 @@
+import atexit
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import log
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+load_dotenv()
+
+# Exportação no formato texto do Prometheus (arquivo para o node_exporter e/ou endpoint /metrics)
+METRICAS_ARQUIVO = os.getenv("METRICAS_ARQUIVO", "")
+METRICAS_PORTA = int(os.getenv("METRICAS_PORTA", "0"))
+# Spans também no OpenTelemetry (exportador configurado pelas variáveis OTEL_* do SDK)
+METRICAS_OTEL = os.getenv("METRICAS_OTEL", "0") == "1" and trace is not None
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metricas = {}
+_lock = threading.Lock()
+_servidor = None
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _rotulos(chave, extra=()):
+    pares = list(chave) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _numero(valor):
+    """Valor no formato de texto do Prometheus sem perder dígitos: inteiros exatos, floats com repr."""
+    if isinstance(valor, int):
+        return str(int(valor))
+    if valor != valor:
+        return "NaN"
+    if valor in (float("inf"), float("-inf")):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor))
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def linhas(self):
+        with self._lock:
+            return [f"{self.nome}{_rotulos(chave)} {_numero(valor)}" for chave, valor in sorted(self._valores.items())]
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = valor
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites=LIMITES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self._series = {}  # chave -> [contagens por limite..., soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * len(self.limites) + [0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextlib.contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def linhas(self):
+        saida = []
+        with self._lock:
+            for chave, serie in sorted(self._series.items()):
+                acumulado = 0
+                for limite, contagem in zip(self.limites, serie):
+                    acumulado += contagem
+                    saida.append(f"{self.nome}_bucket{_rotulos(chave, [('le', f'{limite:g}')])} {acumulado}")
+                saida.append(f"{self.nome}_bucket{_rotulos(chave, [('le', '+Inf')])} {serie[-1]}")
+                saida.append(f"{self.nome}_sum{_rotulos(chave)} {serie[-2]:.6f}")
+                saida.append(f"{self.nome}_count{_rotulos(chave)} {serie[-1]}")
+        return saida
+
+
+def _registrar(classe, nome, ajuda, *args):
+    with _lock:
+        if nome not in _metricas:
+            _metricas[nome] = classe(nome, ajuda, *args)
+        return _metricas[nome]
+
+
+def contador(nome, ajuda):
+    return _registrar(Contador, nome, ajuda)
+
+
+def medidor(nome, ajuda):
+    return _registrar(Medidor, nome, ajuda)
+
+
+def histograma(nome, ajuda, limites=LIMITES_SEGUNDOS):
+    return _registrar(Histograma, nome, ajuda, limites)
+
+
+_spans = histograma("integracao_etapa_segundos", "Duração de cada etapa/trecho instrumentado")
+
+
+@contextlib.contextmanager
+def span(nome, **atributos):
+    """Cronometra um trecho em integracao_etapa_segundos{etapa=nome} e, com METRICAS_OTEL=1, abre um span."""
+    if METRICAS_OTEL:
+        with trace.get_tracer("integracao").start_as_current_span(nome, attributes=atributos):
+            with _spans.cronometrar(etapa=nome):
+                yield
+    else:
+        with _spans.cronometrar(etapa=nome):
+            yield
+
+
+def texto():
+    """Todas as métricas no formato de exposição texto do Prometheus."""
+    with _lock:
+        metricas = sorted(_metricas.values(), key=lambda m: m.nome)
+    saida = []
+    for m in metricas:
+        saida.append(f"# HELP {m.nome} {m.ajuda}")
+        saida.append(f"# TYPE {m.nome} {m.tipo}")
+        saida.extend(m.linhas())
+    return "\n".join(saida) + "\n"
+
+
+def gravar(arquivo=None):
+    """Grava o arquivo .prom (troca atômica, como espera o textfile collector do node_exporter)."""
+    arquivo = arquivo or METRICAS_ARQUIVO
+    if not arquivo:
+        return
+    try:
+        tmp = f"{arquivo}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(texto())
+        os.replace(tmp, arquivo)
+    except OSError as e:
+        log.aviso(f"Não foi possível gravar as métricas: {str(e)}")
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def iniciar_servidor(porta=None):
+    """Expõe /metrics em METRICAS_PORTA (0 desliga). Chamadas repetidas reaproveitam o servidor."""
+    global _servidor
+    porta = METRICAS_PORTA if porta is None else porta
+    if not porta or _servidor is not None:
+        return
+    _servidor = ThreadingHTTPServer(("0.0.0.0", porta), _Manipulador)
+    _servidor.daemon_threads = True
+    threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+    log.info(f"Métricas disponíveis em http://0.0.0.0:{porta}/metrics")
+
+
+atexit.register(gravar)
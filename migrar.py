@@ -0,0 +1,62 @@
+import argparse
+import sys
+
+import log
+from banco import MODO_RESERVA, conectar, criar_colunas_reserva, criar_indice
+from entidades import ENTIDADES
+
+# Índices usados pela integração: (status, chave) de cada entidade para a busca dos pendentes
+# e id_pedido para a leitura dos itens de um lote de pedidos (TGSPED)
+INDICES = sorted({(e.tabela, e.indice) for e in ENTIDADES.values()}) + [("pedido_itens", ("id_pedido",))]
+
+# Colunas <status>_reserva e <status>_reserva_ate do MYSQL_MODO_RESERVA, por tabela e coluna de status
+RESERVAS = sorted({(e.tabela, e.coluna_status) for e in ENTIDADES.values()})
+
+
+def executar(reserva=MODO_RESERVA):
+    """Cria no MySQL os índices que faltam; os que já existem são mantidos.
+
+    Com reserva=True (padrão quando MYSQL_MODO_RESERVA=1), cria também as
+    colunas de reserva usadas para dividir o backlog entre vários workers.
+    Pode ser rodado quantas vezes quiser, inclusive por vários processos ao
+    mesmo tempo. Em tabelas grandes a criação leva alguns minutos, mas o
+    InnoDB a faz sem bloquear leituras e gravações. Requer permissão de
+    ALTER/INDEX; os workers em si não alteram o esquema.
+    """
+    conn = conectar()
+    try:
+        for tabela, colunas in INDICES:
+            try:
+                nome = criar_indice(conn, tabela, colunas)
+                if nome:
+                    log.ok(f"Índice {nome} criado em {tabela} ({', '.join(colunas)}).")
+                else:
+                    log.skip(f"{tabela} já tem índice por ({', '.join(colunas)}).")
+            except Exception as e:
+                log.erro(f"Falha ao criar índice em {tabela} ({', '.join(colunas)}): {str(e)}")
+                raise
+        if not reserva:
+            return
+        for tabela, coluna in RESERVAS:
+            try:
+                criadas = criar_colunas_reserva(conn, tabela, coluna)
+                if criadas:
+                    log.ok(f"Colunas {', '.join(criadas)} criadas em {tabela}.")
+                else:
+                    log.skip(f"{tabela} já tem as colunas de reserva de {coluna}.")
+            except Exception as e:
+                log.erro(f"Falha ao criar colunas de reserva de {coluna} em {tabela}: {str(e)}")
+                raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria os índices e, opcionalmente, as colunas de reserva no MySQL.")
+    parser.add_argument("--reserva", action="store_true", default=MODO_RESERVA,
+                        help="cria as colunas de reserva do MYSQL_MODO_RESERVA=1 (padrão se a variável estiver ligada)")
+    args = parser.parse_args()
+    try:
+        executar(args.reserva)
+    except Exception:
+        sys.exit(1)
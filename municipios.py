@@ -0,0 +1,102 @@
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+
+# Índice cidade/UF -> código IBGE, gerado pelo TGSMDF a cada sincronização
+INDICE_ARQUIVO = os.getenv("IBGE_INDICE_CIDADES", ".ibge_indice_cidades.json")
+# Semelhança mínima (0 a 1) para aceitar uma cidade digitada com erro
+SIMILARIDADE_MIN = float(os.getenv("IBGE_SIMILARIDADE_MIN", "0.85"))
+
+
+def normalizar(texto):
+    """Remove acentos, pontuação e diferenças de caixa: "Santa Bárbara d'Oeste" -> "santa barbara d oeste"."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", sem_acento.casefold()).split())
+
+
+# Registro compacto de um município: uma tupla em vez do dict aninhado do IBGE
+Municipio = namedtuple("Municipio", ["id", "nome", "uf"])
+
+
+def uf_do_item_ibge(item):
+    """Sigla da UF num item da API de municípios do IBGE (microrregião ou região imediata)."""
+    try:
+        return item["microrregiao"]["mesorregiao"]["UF"]["sigla"]
+    except (KeyError, TypeError):
+        pass
+    try:
+        return item["regiao-imediata"]["regiao-intermediaria"]["UF"]["sigla"]
+    except (KeyError, TypeError):
+        return None
+
+
+def municipio_do_item_ibge(item):
+    """Municipio(id, nome, uf) a partir de um item da API do IBGE, ou None se faltar id ou nome."""
+    mid = item.get("id")
+    nome = item.get("nome")
+    if mid is None or nome is None:
+        return None
+    return Municipio(mid, nome, uf_do_item_ibge(item))
+
+
+class IndiceCidades:
+    """Resolve (cidade, UF) em código IBGE com um dict por UF, em O(1).
+
+    Quando o nome não bate exatamente, procura o mais parecido da mesma UF
+    (difflib) e guarda o resultado para as próximas consultas.
+    """
+
+    def __init__(self, por_uf=None):
+        self.por_uf = por_uf or {}
+        self._aproximados = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def de_municipios(cls, municipios):
+        """Monta o índice a partir de um iterável de Municipio."""
+        indice = cls()
+        for m in municipios:
+            indice.adicionar(m)
+        return indice
+
+    def adicionar(self, municipio):
+        if municipio.uf:
+            self.por_uf.setdefault(municipio.uf, {})[normalizar(municipio.nome)] = municipio.id
+
+    @classmethod
+    def carregar(cls, arquivo=INDICE_ARQUIVO):
+        try:
+            with open(arquivo, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def gravar(self, arquivo=INDICE_ARQUIVO):
+        tmp = f"{arquivo}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.por_uf, f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp, arquivo)
+
+    def resolver(self, cidade, uf):
+        """Código IBGE da cidade na UF, ou None se não encontrar nada parecido."""
+        uf = (uf or "").strip().upper()
+        nome = normalizar(cidade)
+        cidades = self.por_uf.get(uf)
+        if not nome or not cidades:
+            return None
+
+        codigo = cidades.get(nome)
+        if codigo is not None:
+            return codigo
+
+        with self._lock:
+            if (nome, uf) not in self._aproximados:
+                parecidos = difflib.get_close_matches(nome, cidades.keys(), n=1, cutoff=SIMILARIDADE_MIN)
+                self._aproximados[(nome, uf)] = cidades[parecidos[0]] if parecidos else None
+            return self._aproximados[(nome, uf)]
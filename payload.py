@@ -0,0 +1,108 @@
+import collections
+import functools
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serialização do DatasetSP.save direto para bytes, com o envelope montado uma
+# vez por entidade; usa orjson quando instalado
+
+
+# O payload é só dicts e listas de escalares, sem ciclos: dispensa a checagem de referência circular
+_codificador = json.JSONEncoder(separators=(",", ":"), default=str, check_circular=False)
+
+
+def _dumps_json(obj):
+    return _codificador.encode(obj).encode("utf-8")
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj, default=str)
+else:
+    dumps = _dumps_json
+
+
+# --- CONVERSORES DE COLUNA ---
+class Conversao(collections.namedtuple("Conversao", "coluna converter")):
+    """Origem de campo que é uma coluna da linha passada por converter(valor).
+
+    compilar_campos aplica o converter direto sobre a coluna, sem uma função
+    (linha, contexto) intermediária por campo; chamada como função, se
+    comporta como as demais origens.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, linha, contexto=None):
+        return self.converter(linha[self.coluna])
+
+
+def data(coluna, formato="%d/%m/%Y"):
+    # Datas se repetem muito entre registros (vários pedidos por dia): formata cada uma só uma vez
+    return Conversao(coluna, functools.lru_cache(maxsize=4096)(lambda valor: valor.strftime(formato)))
+
+
+def decimal(coluna):
+    return Conversao(coluna, float)
+
+
+def compilar_campos(campos):
+    """Gera, uma vez por entidade, a função (linha, contexto=None) -> {"0": ..., "1": ..., ...}.
+
+    campos é [(FIELD, origem), ...]; a origem é uma coluna da linha, uma
+    Conversao (data, decimal) ou uma função (linha, contexto). Como em
+    collections.namedtuple, o corpo é gerado como um único literal de dict,
+    com as chaves "0".."N" e cada origem resolvidas aqui: por registro,
+    colunas são lidas direto da linha, conversões aplicadas sobre o valor e
+    só as funções são chamadas, sem laço nem chamada intermediária por campo.
+    """
+    itens, funcoes = [], {}
+    for i, (_, origem) in enumerate(campos):
+        if isinstance(origem, Conversao):
+            funcoes[f"_f{i}"] = origem.converter
+            itens.append(f"{str(i)!r}: _f{i}(linha[{origem.coluna!r}])")
+        elif callable(origem):
+            funcoes[f"_f{i}"] = origem
+            itens.append(f"{str(i)!r}: _f{i}(linha, contexto)")
+        else:
+            itens.append(f"{str(i)!r}: linha[{origem!r}]")
+    codigo = f"def valores(linha, contexto=None):\n    return {{{', '.join(itens)}}}\n"
+    exec(codigo, funcoes)
+    return funcoes["valores"]
+
+
+class ModeloPayload:
+    """Envelope do DatasetSP.save de uma entidade, pré-serializado.
+
+    O cabeçalho (serviceName, entityName, fields) é convertido em bytes uma
+    vez; a cada lote só a lista de records passa pelo serializador, numa
+    única chamada.
+    """
+
+    def __init__(self, entidade, fields):
+        envelope = dumps({
+            "serviceName": "DatasetSP.save",
+            "requestBody": {"entityName": entidade, "standAlone": False, "fields": list(fields), "records": []},
+        })
+        self._prefixo, self._sufixo = envelope[:-4], envelope[-2:]  # corta em "[]" | "}}"
+
+    def serializar(self, lista_values):
+        return self._prefixo + dumps([{"values": values} for values in lista_values]) + self._sufixo
+
+
+_modelos = {}
+_lock = threading.Lock()
+
+
+def modelo(entidade, fields):
+    """Modelo da entidade, montado na primeira chamada e reutilizado depois."""
+    chave = (entidade, tuple(fields))
+    with _lock:
+        if chave not in _modelos:
+            _modelos[chave] = ModeloPayload(entidade, fields)
+        return _modelos[chave]
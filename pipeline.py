@@ -0,0 +1,134 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import log
+import metricas
+import TGSCAB
+import TGSITE
+import TGSMDF
+import TGSPAR
+import TGSPED
+import TGSSER
+
+# Pedidos completos (TGSPED) em vez de cabeçalhos, itens e séries em etapas separadas
+PEDIDOS_COMPLETOS = os.getenv("PIPELINE_PEDIDOS_COMPLETOS", "0") == "1"
+
+
+class Etapa:
+    def __init__(self, nome, funcao, dependencias=(), **kwargs):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.kwargs = kwargs
+
+
+def montar_etapas(com_municipios=False, marcas=None, pedidos_completos=PEDIDOS_COMPLETOS):
+    """Dependências reais entre as entidades no Sankhya.
+
+    Parceiros -> cabeçalhos -> itens -> séries. As séries de itens que já
+    estavam integrados não dependem de nada e rodam junto com parceiros e
+    cabeçalhos; as séries dos itens novos esperam a etapa de itens.
+    Com pedidos_completos, cabeçalho, itens e séries dos pedidos novos vão
+    juntos em TGSPED; TGSITE depois só pega itens de pedidos com cabeçalho
+    aceito e TGSSER só séries de itens já integrados.
+    marcas ({"TGSPAR": id, ...}) limita cada etapa às chaves acima da marca.
+    """
+    marcas = marcas or {}
+    etapas = []
+    dependencias_par = ()
+    if com_municipios:
+        etapas.append(Etapa("TGSMDF", TGSMDF.executar))
+        dependencias_par = ("TGSMDF",)
+    if pedidos_completos:
+        return etapas + [
+            Etapa("TGSPAR", TGSPAR.executar, dependencias_par, a_partir_de=marcas.get("TGSPAR")),
+            Etapa("TGSPED", TGSPED.executar, ("TGSPAR",), a_partir_de=marcas.get("TGSPED")),
+            Etapa("TGSITE", TGSITE.executar, ("TGSPED",),
+                  apenas_pedidos_integrados=True, a_partir_de=marcas.get("TGSITE")),
+            Etapa("TGSSER", TGSSER.executar, ("TGSITE",),
+                  apenas_itens_integrados=True, a_partir_de=marcas.get("TGSSER")),
+        ]
+    etapas += [
+        Etapa("TGSPAR", TGSPAR.executar, dependencias_par, a_partir_de=marcas.get("TGSPAR")),
+        Etapa("TGSSER (itens já integrados)", TGSSER.executar,
+              apenas_itens_integrados=True, a_partir_de=marcas.get("TGSSER")),
+        Etapa("TGSCAB", TGSCAB.executar, ("TGSPAR",), a_partir_de=marcas.get("TGSCAB")),
+        Etapa("TGSITE", TGSITE.executar, ("TGSCAB",), a_partir_de=marcas.get("TGSITE")),
+        Etapa("TGSSER", TGSSER.executar, ("TGSITE", "TGSSER (itens já integrados)"), a_partir_de=marcas.get("TGSSER")),
+    ]
+    return etapas
+
+
+def executar(etapas, paralelas=2):
+    """Roda as etapas respeitando as dependências. Retorna {nome: (status, segundos, resultado)}."""
+    pendentes = {e.nome: e for e in etapas}
+    resultados = {}
+    em_execucao = {}
+
+    def rodar(etapa):
+        inicio = time.perf_counter()
+        log.info(f"Etapa {etapa.nome} iniciada.")
+        with metricas.span(etapa.nome):
+            resultado = etapa.funcao(**etapa.kwargs)
+        return resultado, time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=paralelas) as executor:
+        while pendentes or em_execucao:
+            antes = len(pendentes)
+            for nome, etapa in list(pendentes.items()):
+                falhas = [d for d in etapa.dependencias if resultados.get(d, ("",))[0] in ("FALHA", "PULADA")]
+                if falhas:
+                    log.skip(f"Etapa {nome} pulada: dependência {', '.join(falhas)} não concluiu.")
+                    resultados[nome] = ("PULADA", 0.0, None)
+                    del pendentes[nome]
+                elif all(resultados.get(d, ("",))[0] == "OK" for d in etapa.dependencias):
+                    em_execucao[executor.submit(rodar, etapa)] = etapa
+                    del pendentes[nome]
+
+            if not em_execucao:
+                if len(pendentes) == antes:
+                    raise ValueError(f"Dependências inexistentes ou circulares: {', '.join(pendentes)}")
+                continue
+
+            concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidas:
+                etapa = em_execucao.pop(futuro)
+                try:
+                    resultado, segundos = futuro.result()
+                    resultados[etapa.nome] = ("OK", segundos, resultado)
+                    log.ok(f"Etapa {etapa.nome} concluída em {segundos:.1f}s.")
+                except Exception as e:
+                    resultados[etapa.nome] = ("FALHA", 0.0, None)
+                    log.erro(f"Etapa {etapa.nome} falhou: {str(e)}")
+
+    return resultados
+
+
+def imprimir_resumo(resultados, total_segundos):
+    linhas = ["Tempo por etapa:"]
+    for nome, (status, segundos, resultado) in resultados.items():
+        registros = "" if resultado is None else f" | {resultado['lidos']} registros"
+        linhas.append(f"  {nome:<32} {status:<7} {segundos:8.1f}s{registros}")
+    linhas.append(f"  {'TOTAL':<32} {'':<7} {total_segundos:8.1f}s")
+    log.resumo("\n".join(linhas), etapas={nome: {"status": r[0], "segundos": round(r[1], 3)} for nome, r in resultados.items()},
+               total_segundos=round(total_segundos, 3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa a integração MySQL -> Sankhya num único processo.")
+    parser.add_argument("--municipios", action="store_true", help="recarrega AD_TGSMDF antes dos parceiros")
+    parser.add_argument("--pedidos-completos", action="store_true", default=PEDIDOS_COMPLETOS,
+                        help="envia cabeçalho, itens e séries de cada pedido no mesmo lote (TGSPED)")
+    parser.add_argument("--paralelas", type=int, default=2, help="etapas independentes rodando ao mesmo tempo")
+    args = parser.parse_args()
+
+    metricas.iniciar_servidor()
+    inicio = time.perf_counter()
+    resultados = executar(montar_etapas(args.municipios, pedidos_completos=args.pedidos_completos), args.paralelas)
+    imprimir_resumo(resultados, time.perf_counter() - inicio)
+
+    if any(status != "OK" for status, _, _ in resultados.values()):
+        sys.exit(1)
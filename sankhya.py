@@ -0,0 +1,287 @@
+import requests
+import contextlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import log
+import lote_adaptativo
+import metricas
+from gateway import gateway
+from payload import modelo as modelo_payload
+
+try:
+    import httpx
+    import h2  # noqa: F401  (necessário para HTTP/2 no httpx)
+except ImportError:
+    httpx = None
+
+# Carrega variáveis do .env
+load_dotenv()
+
+# --- CONFIGURAÇÕES ---
+
+# URLs e autenticação API Sankhya
+auth_url = os.getenv("SANKHYA_AUTH_URL")
+api_url = os.getenv("SANKHYA_API_URL")
+app_key = os.getenv("SANKHYA_APP_KEY")
+auth_token = os.getenv("SANKHYA_AUTH_TOKEN")
+username = os.getenv("SANKHYA_USERNAME")
+password = os.getenv("SANKHYA_PASSWORD")
+
+# Cache do token bearer (memória + disco, compartilhado entre as etapas do launcher.bat)
+TOKEN_CACHE_ARQUIVO = os.getenv("SANKHYA_TOKEN_CACHE", ".sankhya_token.json")
+TOKEN_VALIDADE = int(os.getenv("SANKHYA_TOKEN_VALIDADE", "300"))  # segundos
+TOKEN_MARGEM = 30  # renova um pouco antes de expirar
+
+STATUS_TOKEN_INVALIDO = (401, 403)
+
+# Tempo máximo de cada chamada (segundos)
+AUTENTICACAO_TIMEOUT = 60
+ENVIO_TIMEOUT = 120
+# Pior caso de uma tentativa do gateway: token + POST, repetidos uma vez em 401/403
+PIOR_TENTATIVA_SEGUNDOS = 2 * (AUTENTICACAO_TIMEOUT + ENVIO_TIMEOUT)
+
+# Pool de conexões HTTP (keep-alive) compartilhado por todos os módulos
+HTTP_POOL_TAMANHO = int(os.getenv("HTTP_POOL_TAMANHO", "10"))
+HTTP2 = os.getenv("HTTP2", "1") == "1"
+
+
+_tempo_token = metricas.histograma("integracao_token_segundos", "Tempo de cada autenticação (bearer token)")
+_tempo_payload = metricas.histograma("integracao_payload_segundos", "Tempo de montagem/serialização do payload")
+_bytes_enviados = metricas.contador("integracao_bytes_enviados_total", "Bytes enviados ao DatasetSP.save")
+_registros_enviados = metricas.contador("integracao_registros_enviados_total", "Registros enviados, por resultado final")
+
+
+# --- TRANSPORTE HTTP ---
+class Transporte:
+    """Sessão HTTP única com keep-alive para auth, DatasetSP.save e IBGE.
+
+    Usa httpx com HTTP/2 quando httpx e h2 estão instalados; caso contrário,
+    uma requests.Session com pool de HTTPAdapter. As respostas dos dois
+    expõem status_code, text e json().
+    """
+
+    def __init__(self, pool_tamanho=HTTP_POOL_TAMANHO, http2=HTTP2):
+        self.http2 = bool(http2 and httpx is not None)
+        if self.http2:
+            limites = httpx.Limits(max_connections=pool_tamanho, max_keepalive_connections=pool_tamanho)
+            self._cliente = httpx.Client(http2=True, limits=limites)
+        else:
+            self._cliente = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=pool_tamanho, pool_maxsize=pool_tamanho)
+            self._cliente.mount("https://", adaptador)
+            self._cliente.mount("http://", adaptador)
+
+    def post(self, url, headers=None, data=None, timeout=120):
+        if self.http2:
+            return self._cliente.post(url, headers=headers, content=data, timeout=timeout)
+        return self._cliente.post(url, headers=headers, data=data, timeout=timeout)
+
+    def get(self, url, headers=None, timeout=120):
+        return self._cliente.get(url, headers=headers, timeout=timeout)
+
+    @contextlib.contextmanager
+    def fluxo(self, url, headers=None, timeout=120, tamanho_pedaco=64 * 1024):
+        """GET sem carregar o corpo em memória: entrega (resposta, pedaços de bytes sob demanda)."""
+        if self.http2:
+            with self._cliente.stream("GET", url, headers=headers, timeout=timeout) as r:
+                yield r, r.iter_bytes(tamanho_pedaco)
+            return
+        r = self._cliente.get(url, headers=headers, timeout=timeout, stream=True)
+        try:
+            yield r, r.iter_content(tamanho_pedaco)
+        finally:
+            r.close()
+
+    def fechar(self):
+        self._cliente.close()
+
+
+transporte = Transporte()
+
+
+# --- FUNÇÃO PARA OBTER TOKEN BEARER ---
+def get_bearer_token():
+    headers = {"AppKey": app_key, "Token": auth_token, "Username": username, "Password": password}
+    r = transporte.post(auth_url, headers=headers, timeout=AUTENTICACAO_TIMEOUT)
+    if r.status_code == 200:
+        token = r.json().get("bearerToken")
+        if not token:
+            raise Exception("Token não encontrado na resposta.")
+        return token
+    raise Exception(f"Erro ao autenticar: {r.status_code} - {r.text}")
+
+
+class TokenProvider:
+    """Mantém o token bearer em memória e em disco, renovando só quando necessário.
+
+    Um único lock garante que, com vários workers, apenas uma chamada faça a
+    renovação; as demais esperam e reutilizam o token novo.
+    """
+
+    def __init__(self, arquivo=TOKEN_CACHE_ARQUIVO, validade=TOKEN_VALIDADE):
+        self.arquivo = arquivo
+        self.validade = validade
+        self._token = None
+        self._expira_em = 0.0
+        self._lock = threading.Lock()
+
+    def _valido(self):
+        return self._token is not None and time.time() < self._expira_em - TOKEN_MARGEM
+
+    def _ler_disco(self):
+        if not self.arquivo:
+            return
+        try:
+            with open(self.arquivo, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            self._token = dados.get("token")
+            self._expira_em = float(dados.get("expira_em", 0))
+        except (OSError, ValueError):
+            self._token, self._expira_em = None, 0.0
+
+    def _gravar_disco(self):
+        if not self.arquivo:
+            return
+        tmp = f"{self.arquivo}.tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"token": self._token, "expira_em": self._expira_em}, f)
+            os.replace(tmp, self.arquivo)
+        except OSError as e:
+            log.aviso(f"Não foi possível gravar o cache do token: {str(e)}")
+
+    def _apagar_disco(self):
+        if not self.arquivo:
+            return
+        try:
+            os.remove(self.arquivo)
+        except OSError:
+            pass
+
+    def obter(self):
+        with self._lock:
+            if self._valido():
+                return self._token
+            self._ler_disco()
+            if self._valido():
+                return self._token
+            with _tempo_token.cronometrar():
+                self._token = get_bearer_token()
+            self._expira_em = time.time() + self.validade
+            self._gravar_disco()
+            return self._token
+
+    def invalidar(self, token_usado):
+        # Só descarta se ninguém renovou desde que o token rejeitado foi obtido
+        with self._lock:
+            if self._token == token_usado:
+                self._token, self._expira_em = None, 0.0
+                self._apagar_disco()
+
+
+tokens = TokenProvider()
+
+
+def headers_api(token):
+    return {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+
+
+def enviar_payload(payload, timeout=ENVIO_TIMEOUT, ao_tentar=None, antes_de_tentar=None):
+    """POST no api_url com o token em cache; renova uma vez se a API devolver 401/403.
+
+    Passa pelo gateway (gateway.py): respeita os limites de taxa, repete em
+    429/5xx/timeout com backoff e espera enquanto o disjuntor estiver aberto.
+    ao_tentar(segundos, falha) e antes_de_tentar() são chamados a cada
+    tentativa (ver Gateway.executar).
+    """
+    corpo = payload if isinstance(payload, (bytes, str)) else json.dumps(payload).encode("utf-8")
+
+    def requisicao():
+        token = tokens.obter()
+        response = transporte.post(api_url, headers=headers_api(token), data=corpo, timeout=timeout)
+        if response.status_code in STATUS_TOKEN_INVALIDO:
+            tokens.invalidar(token)
+            token = tokens.obter()
+            response = transporte.post(api_url, headers=headers_api(token), data=corpo, timeout=timeout)
+        return response
+
+    return gateway.executar(requisicao, len(corpo), ao_tentar, antes_de_tentar)
+
+
+# --- ENVIO EM LOTE (DatasetSP.save com vários registros) ---
+
+# Tamanho inicial do lote; com SANKHYA_LOTE_ADAPTATIVO=1 ele é ajustado por entidade
+# (ver lote_adaptativo.py). Com adaptativo desligado, 1 reproduz o envio unitário
+LOTE_TAMANHO = max(1, int(os.getenv("SANKHYA_LOTE_TAMANHO", "100")))
+
+
+def tamanho_lote(entidade, inicial=None):
+    """Tamanho de lote atual da entidade."""
+    return lote_adaptativo.controlador(entidade, inicial or LOTE_TAMANHO).tamanho
+
+
+def fatiar_lotes(entidade, lst, inicial=None):
+    """Divide lst (lista ou gerador) em lotes do tamanho atual da entidade, reavaliado a cada lote."""
+    return lote_adaptativo.controlador(entidade, inicial or LOTE_TAMANHO).fatiar(lst)
+
+
+def interpretar_resposta(response):
+    """Retorna (ok, detalhe) para uma resposta do DatasetSP.save."""
+    if response.status_code != 200:
+        return False, f"{response.status_code} - {response.text}"
+    dados = response.json()
+    if isinstance(dados, dict) and dados.get("status") == "ERROR":
+        return False, dados
+    return True, dados
+
+
+def salvar_registros(entidade, fields, itens, reservar=None):
+    """Envia itens [(chave, values), ...] num único DatasetSP.save.
+
+    Se o lote for recusado pelos dados (HTTP 200 com status ERROR), divide-o
+    ao meio e reenvia cada metade recursivamente: as metades boas seguem em
+    sub-lotes e cada registro ruim é isolado em cerca de log2(N) requisições,
+    em vez de N envios unitários. Falhas de transporte (429/5xx depois das
+    novas tentativas do gateway, erro de rede, autenticação) não são
+    divididas: todo o lote volta como falha, para não multiplicar o tráfego
+    durante uma indisponibilidade. reservar(chaves), se informado, roda antes
+    de cada tentativa de cada sub-lote (MYSQL_MODO_RESERVA=1); se lançar
+    exceção, o sub-lote não é enviado e volta inteiro como falha.
+    Retorna (sucessos, falhas): lista de chaves e lista de (chave, detalhe).
+    """
+    with _tempo_payload.cronometrar(entidade=entidade):
+        corpo = modelo_payload(entidade, fields).serializar([v for _, v in itens])
+    _bytes_enviados.inc(len(corpo), entidade=entidade)
+    controlador = lote_adaptativo.controlador(entidade, LOTE_TAMANHO)
+
+    def ao_tentar(segundos, falha_transporte):
+        # Cada tentativa conta para o tamanho do lote só com a latência da própria requisição
+        controlador.registrar(len(itens), segundos, len(corpo), falha_transporte)
+
+    antes_de_tentar = (lambda: reservar([chave for chave, _ in itens])) if reservar else None
+    recusado = False
+    try:
+        response = enviar_payload(corpo, ao_tentar=ao_tentar, antes_de_tentar=antes_de_tentar)
+        ok, detalhe = interpretar_resposta(response)
+        recusado = not ok and response.status_code == 200
+    except Exception as e:
+        ok, detalhe = False, str(e)
+
+    if ok:
+        _registros_enviados.inc(len(itens), entidade=entidade, resultado="ok")
+        return [chave for chave, _ in itens], []
+    if len(itens) == 1 or not recusado:
+        _registros_enviados.inc(len(itens), entidade=entidade, resultado="erro")
+        return [], [(chave, detalhe) for chave, _ in itens]
+
+    meio = len(itens) // 2
+    log.info(f"Lote {entidade} com {len(itens)} registros recusado. Dividindo em {meio} + {len(itens) - meio}...")
+    sucessos, falhas = salvar_registros(entidade, fields, itens[:meio], reservar)
+    s, f = salvar_registros(entidade, fields, itens[meio:], reservar)
+    return sucessos + s, falhas + f
@@ -0,0 +1,415 @@
+import contextlib
+import threading
+
+import log
+from banco import Marcador, Reserva, conectar, ler_pendentes, ler_por_chaves, marcar_duplicados
+from despacho import Despachante
+from diario import obter_diario, retomar_marcacoes, salvar_com_diario
+from entidades import CABECALHOS, ITENS, SERIES
+from sankhya import PIOR_TENTATIVA_SEGUNDOS, fatiar_lotes, tamanho_lote
+
+
+# --- DEDUPLICAÇÃO ENTRE EXECUÇÕES ---
+def separar_ja_integrados(entidade, lote, valores_dedup):
+    """Separa do lote as chaves cujo valor de deduplicação já foi aceito numa execução anterior."""
+    ja = obter_diario().ja_integrados(entidade.nome, {valores_dedup[c] for c, _ in lote if c in valores_dedup})
+    if not ja:
+        return lote, []
+    pulados = [c for c, _ in lote if c in valores_dedup and str(valores_dedup[c]) in ja]
+    if log.depurando():
+        for chave in pulados:
+            log.debug("%s %s - %s %s já integrado anteriormente. Pulando...",
+                      entidade.rotulo, chave, entidade.deduplicar, valores_dedup[chave])
+    log.skip(f"{len(pulados)} registros de {entidade.rotulo} com {entidade.deduplicar} já integrado anteriormente.",
+             entidade=entidade.nome, pulados=len(pulados))
+    ignorar = set(pulados)
+    return [(c, v) for c, v in lote if c not in ignorar], pulados
+
+
+# --- RESERVA (MYSQL_MODO_RESERVA=1) ---
+def ainda_reservados(reserva, entidade, chaves):
+    """Renova a reserva das chaves antes de entrarem na fila; descarta as que outro worker reservou."""
+    minhas = reserva.renovar(chaves)
+    if len(minhas) < len(chaves):
+        log.aviso(f"{len(chaves) - len(minhas)} registros de {entidade.rotulo} com reserva vencida e "
+                  f"retomados por outro worker. Não serão enviados por este.")
+    return minhas
+
+
+# --- ENVIO DE UM LOTE (executado pelos workers) ---
+def enviar_lote(entidade, lote, marcador, valores_dedup=None, reserva=None):
+    try:
+        if valores_dedup:
+            lote, pulados = separar_ja_integrados(entidade, lote, valores_dedup)
+            # Duplicados não geram chamada HTTP: só a marcação no MySQL
+            marcador.marcar(pulados)
+            if not lote:
+                return
+
+        sucessos, falhas = salvar_com_diario(entidade.nome, entidade.fields, lote,
+                                             reservar=reserva.garantir if reserva else None)
+        if valores_dedup:
+            obter_diario().registrar_integrados(entidade.nome, [valores_dedup[c] for c in sucessos if c in valores_dedup])
+
+        # Corpo da resposta só nas recusas; aceitos viram uma linha por lote (uma por registro só em DEBUG)
+        for chave, detalhe in falhas:
+            log.erro(f"{entidade.rotulo} {chave} - Retorno da API indicou erro: {detalhe}", entidade=entidade.nome, chave=chave)
+
+        if log.depurando():
+            for chave in sucessos:
+                log.debug("%s %s integrado com sucesso.", entidade.rotulo, chave)
+        resumo = log.erro if falhas else log.ok
+        resumo(f"Lote {entidade.nome} {lote[0][0]}..{lote[-1][0]}: {len(sucessos)}/{len(lote)} registros integrados.",
+               entidade=entidade.nome, sucessos=len(sucessos), falhas=len(falhas))
+
+        # Atualiza a coluna de status apenas dos registros aceitos
+        marcador.marcar(sucessos)
+
+    except Exception as e:
+        log.excecao(f"Lote {entidade.nome} {lote[0][0]}..{lote[-1][0]} - Erro: {str(e)}")
+
+
+# --- ENVIO DE UM GRUPO (uma linha que gera vários registros, ex.: séries de um item) ---
+def enviar_grupo(entidade, linha, contexto, marcador, reserva=None):
+    grupo = linha[entidade.chave]
+    # A linha reservada no MySQL é a do grupo, não a de cada registro enviado
+    reservar = (lambda _: reserva.garantir([grupo])) if reserva else None
+    try:
+        try:
+            registros = entidade.registros(linha, contexto)
+        except Exception as e:
+            log.erro(f"{entidade.rotulo} {grupo} - {str(e)}")
+            return
+
+        # Todos os registros entram no diário antes do primeiro envio, para o grupo só ser
+        # considerado enviado quando todos tiverem sido aceitos
+        obter_diario().registrar_pendentes(entidade.nome, registros, grupo=grupo)
+
+        # O grupo vai inteiro no mesmo DatasetSP.save (fatiado só se passar do tamanho de lote)
+        sucessos, falhas = [], []
+        for lote in fatiar_lotes(entidade.nome, registros):
+            s, f = salvar_com_diario(entidade.nome, entidade.fields, lote, grupo=grupo, reservar=reservar)
+            sucessos.extend(s)
+            falhas.extend(f)
+
+        for chave, detalhe in falhas:
+            log.erro(f"{entidade.rotulo} {grupo} registro {chave} - Retorno da API indicou erro: {detalhe}",
+                     entidade=entidade.nome, chave=grupo)
+
+        if falhas:
+            log.erro(f"{entidade.rotulo} {grupo}: {len(sucessos)}/{len(registros)} registros integrados.")
+        else:
+            log.ok(f"{entidade.rotulo} {grupo} integrado com sucesso ({len(sucessos)} registros).")
+            marcador.marcar([grupo])
+
+    except Exception as e:
+        log.excecao(f"{entidade.rotulo} {grupo} - Erro: {str(e)}")
+
+
+# --- CONEXÕES E MARCADORES DE UMA EXECUÇÃO ---
+@contextlib.contextmanager
+def sessao(criar_marcadores, retomar, reservada):
+    """Abre as conexões com o MySQL e os marcadores de uma execução; fecha tudo ao sair.
+
+    criar_marcadores(conn, lock) devolve {nome: Marcador}; retomar é a lista
+    de (entidade, nome) cujas marcações aceitas numa execução anterior e não
+    gravadas no MySQL são entregues ao marcador antes da leitura. reservada
+    é a entidade cujas linhas são reservadas na leitura (MYSQL_MODO_RESERVA=1).
+    Entrega (conn_leitura, conn, marcadores, reserva) e, ao sair, grava o que
+    ficou no buffer dos marcadores, mesmo em caso de erro.
+    """
+    marcadores = {}
+    conn_leitura = conn = None
+    try:
+        # Num processo de longa duração (daemon.py) o diário é o mesmo entre ciclos: a retenção roda aqui
+        obter_diario().limpar_periodicamente()
+    except Exception as e:
+        log.aviso(f"Falha ao limpar o diário local: {str(e)}")
+    try:
+        # Uma conexão para a leitura paginada (sempre nesta thread), outra para gravar os status
+        conn_leitura = conectar()
+        conn = conectar()
+        # Marcadores e reserva gravam pela mesma conexão, a partir dos workers: um lock para todos
+        trava = threading.Lock()
+        marcadores = criar_marcadores(conn, trava)
+        reserva = Reserva(conn, reservada.tabela, reservada.chave, coluna=reservada.coluna_status,
+                          margem=PIOR_TENTATIVA_SEGUNDOS, lock=trava)
+        for entidade, nome in retomar:
+            try:
+                retomar_marcacoes(entidade.nome, marcadores[nome])
+            except Exception as e:
+                log.aviso(f"Falha ao retomar marcações pendentes de {entidade.nome}: {str(e)}")
+        yield conn_leitura, conn, marcadores, reserva
+
+    except Exception as e:
+        log.fatal(f"Erro ao conectar no banco MySQL: {str(e)}")
+        raise
+
+    finally:
+        for marcador in marcadores.values():
+            try:
+                marcador.descarregar()
+            except Exception as e:
+                log.erro(f"Falha ao gravar status no MySQL: {str(e)}")
+        if conn_leitura is not None:
+            conn_leitura.close()
+        if conn is not None:
+            conn.close()
+
+
+# --- INÍCIO DO PROCESSO ---
+def sincronizar(entidade, a_partir_de=None, filtro_extra=None):
+    """Integra as linhas pendentes da entidade no Sankhya.
+
+    Lê os pendentes em páginas (keyset, com reserva se MYSQL_MODO_RESERVA=1),
+    envia em lotes adaptativos pelo Despachante e marca os aceitos em bulk.
+    Com a_partir_de lê só chaves maiores que a informada (modo daemon);
+    filtro_extra é acrescentado ao filtro da entidade com AND.
+    Retorna {"lidos": linhas lidas, "ultima_chave": maior chave lida}.
+    """
+    total, ultima_chave = 0, a_partir_de
+    filtro = entidade.filtro + (f" AND {filtro_extra}" if filtro_extra else "")
+
+    def criar_marcadores(conn, trava):
+        return {"status": Marcador(conn, entidade.tabela, entidade.chave, coluna=entidade.coluna_status, lock=trava,
+                                   ao_gravar=lambda chaves: obter_diario().registrar_marcados(entidade.nome, chaves))}
+
+    with sessao(criar_marcadores, [(entidade, "status")], entidade) as (conn_leitura, conn, marcadores, reserva):
+        marcador = marcadores["status"]
+        if entidade.dedup_sql:
+            # Repetidos entre os pendentes são marcados no próprio MySQL; a checagem em Python fica como rede
+            try:
+                repetidos = marcar_duplicados(conn, entidade.tabela, entidade.chave, entidade.dedup_sql, filtro,
+                                              coluna=entidade.coluna_status)
+                if repetidos:
+                    log.skip(f"{repetidos} registros de {entidade.rotulo} com {entidade.deduplicar} repetido marcados sem envio.")
+            except Exception as e:
+                log.aviso(f"Deduplicação no MySQL indisponível para {entidade.nome}, seguindo só em Python: {str(e)}")
+
+        linhas = ler_pendentes(conn_leitura, entidade.select, entidade.chave, filtro, inicio=a_partir_de,
+                               reserva=(entidade.tabela, entidade.coluna_status))
+
+        contexto = entidade.preparar() if entidade.preparar else None
+        processados = set()
+        repetidos = 0
+
+        def submeter(despachante, lote, valores_dedup):
+            if entidade.fechar_lote:
+                entidade.fechar_lote(contexto)
+            # Renova a reserva de cada lote ao entrar na fila; no envio, cada tentativa a garante de novo
+            minhas = set(ainda_reservados(reserva, entidade, [c for c, _ in lote]))
+            lote = [(c, v) for c, v in lote if c in minhas]
+            if lote:
+                # Lotes não precisam de afinidade: vão para o primeiro worker livre
+                despachante.submeter(None, enviar_lote, entidade, lote, marcador, valores_dedup, reserva)
+
+        def submeter_grupos(despachante, grupos):
+            # Uma renovação para todas as linhas acumuladas, não uma por linha
+            minhas = set(ainda_reservados(reserva, entidade, [linha[entidade.chave] for linha in grupos]))
+            for linha in grupos:
+                chave = linha[entidade.chave]
+                if chave in minhas:
+                    # Os registros de uma mesma linha ficam sempre no mesmo worker, em ordem
+                    despachante.submeter(chave, enviar_grupo, entidade, linha, contexto, marcador, reserva)
+
+        lote, valores_dedup, grupos = [], {}, []
+
+        # Envia em lotes do tamanho atual da entidade (adaptativo), até SANKHYA_CONCORRENCIA lotes em paralelo,
+        # à medida que as páginas chegam do MySQL
+        with Despachante() as despachante:
+            for linha in linhas:
+                total += 1
+                chave = linha[entidade.chave]
+                ultima_chave = chave
+                valor = entidade.valor_dedup(linha)
+                if valor is not None and valor in processados:
+                    if entidade.deduplicar == entidade.chave:
+                        log.debug("%s %s já processado. Pulando...", entidade.rotulo, chave)
+                    else:
+                        log.debug("%s %s - %s %s já processado. Pulando...", entidade.rotulo, chave, entidade.deduplicar, valor)
+                    repetidos += 1
+                    marcador.marcar([chave])
+                    continue
+
+                if valor is not None:
+                    processados.add(valor)
+                    if entidade.dedup_persistente:
+                        valores_dedup[chave] = valor
+
+                if entidade.registros:
+                    # Um grupo por tarefa, submetidos em blocos do tamanho de lote
+                    grupos.append(linha)
+                    if len(grupos) >= tamanho_lote(entidade.nome):
+                        submeter_grupos(despachante, grupos)
+                        grupos = []
+                    continue
+
+                try:
+                    lote.append((chave, entidade.valores(linha, contexto)))
+                except Exception as e:
+                    log.excecao(f"{entidade.rotulo} {chave} - Erro: {str(e)}")
+
+                if len(lote) >= tamanho_lote(entidade.nome):
+                    submeter(despachante, lote, valores_dedup)
+                    lote, valores_dedup = [], {}
+
+            if lote:
+                submeter(despachante, lote, valores_dedup)
+            if grupos:
+                submeter_grupos(despachante, grupos)
+
+        log.info(f"{total} registros lidos" + (f", {repetidos} repetidos pulados." if repetidos else "."),
+                 entidade=entidade.nome, lidos=total, repetidos=repetidos)
+
+    return {"lidos": total, "ultima_chave": ultima_chave}
+
+
+# --- MODO PEDIDO COMPLETO (cabeçalho + itens + séries no mesmo lote) ---
+SELECT_ITENS_PEDIDO = (
+    "SELECT id_item, id_pedido, id_produto, quantidade, preco_unitario, desconto, numeros_serie, "
+    "integrado, integradoser FROM pedido_itens"
+)
+
+
+def _salvar(entidade, itens, grupo=None, reservar=None):
+    """Envia itens em lotes do tamanho atual da entidade; imprime as recusas e devolve o conjunto aceito.
+
+    Nas entidades com dedup_persistente (deduplicadas pela própria chave), o
+    que já foi aceito em execuções anteriores conta como aceito sem novo envio.
+    """
+    aceitos = set()
+    valores_dedup = {c: c for c, _ in itens} if entidade.dedup_persistente else None
+    if valores_dedup:
+        itens, pulados = separar_ja_integrados(entidade, itens, valores_dedup)
+        aceitos.update(pulados)
+    for lote in fatiar_lotes(entidade.nome, itens):
+        sucessos, falhas = salvar_com_diario(entidade.nome, entidade.fields, lote, grupo=grupo, reservar=reservar)
+        aceitos.update(sucessos)
+        if valores_dedup:
+            obter_diario().registrar_integrados(entidade.nome, sucessos)
+        for chave, detalhe in falhas:
+            log.erro(f"{entidade.nome} {chave} - Retorno da API indicou erro: {detalhe}", entidade=entidade.nome, chave=chave)
+    return aceitos
+
+
+def _valores(entidade, linhas):
+    registros = []
+    for linha in linhas:
+        try:
+            registros.append((linha[entidade.chave], entidade.valores(linha)))
+        except Exception as e:
+            log.excecao(f"{entidade.rotulo} {linha[entidade.chave]} - Erro: {str(e)}")
+    return registros
+
+
+def enviar_pedidos(pedidos, itens, marcadores, reserva=None):
+    """Envia um lote de pedidos completos: AD_TGSCAB, depois AD_TGSITE e AD_TGSSER dos pedidos aceitos.
+
+    Itens só vão se o cabeçalho foi aceito; séries só vão se o item foi
+    aceito agora ou já estava integrado. Itens com item e séries aceitos são
+    marcados num único UPDATE das duas colunas.
+    """
+    primeiro, ultimo = pedidos[0]["id_pedido"], pedidos[-1]["id_pedido"]
+    # As linhas reservadas são as dos pedidos do lote, inclusive durante o envio de itens e séries
+    ids = [p["id_pedido"] for p in pedidos]
+    reservar = (lambda _: reserva.garantir(ids)) if reserva else None
+    try:
+        aceitos_cab = _salvar(CABECALHOS, _valores(CABECALHOS, pedidos), reservar=reservar)
+        marcadores["cab"].marcar(list(aceitos_cab))
+
+        itens = [i for i in itens if i["id_pedido"] in aceitos_cab]
+        itens_pendentes = [i for i in itens if i["integrado"] is None]
+        aceitos_ite = _salvar(ITENS, _valores(ITENS, itens_pendentes), reservar=reservar)
+
+        # Séries de todos os itens do lote vão juntas; o grupo de cada série no diário é o seu item
+        series, itens_com_series, series_invalidas = [], {}, 0
+        for item in itens:
+            if item["integradoser"] is not None or (item["integrado"] is None and item["id_item"] not in aceitos_ite):
+                continue
+            try:
+                registros = SERIES.registros(item, None)
+            except Exception as e:
+                log.erro(f"{SERIES.rotulo} {item['id_item']} - {str(e)}")
+                series_invalidas += 1
+                continue
+            itens_com_series[item["id_item"]] = {chave for chave, _ in registros}
+            series.extend(registros)
+        obter_diario().registrar_pendentes(SERIES.nome, series, grupo=lambda chave: chave[0])
+        aceitas = _salvar(SERIES, series, grupo=lambda chave: chave[0], reservar=reservar)
+        aceitos_ser = {id_item for id_item, chaves in itens_com_series.items() if chaves <= aceitas}
+
+        marcadores["ambos"].marcar([i for i in aceitos_ite if i in aceitos_ser])
+        marcadores["ite"].marcar([i for i in aceitos_ite if i not in aceitos_ser])
+        marcadores["ser"].marcar([i for i in aceitos_ser if i not in aceitos_ite])
+
+        falhas = (len(pedidos) - len(aceitos_cab)) + (len(itens_pendentes) - len(aceitos_ite)) \
+            + (len(series) - len(aceitas)) + series_invalidas
+        resumo = log.erro if falhas else log.ok
+        resumo(f"Pedidos {primeiro}..{ultimo}: {len(aceitos_cab)}/{len(pedidos)} cabeçalhos, "
+               f"{len(aceitos_ite)}/{len(itens_pendentes)} itens e {len(aceitas)}/{len(series)} séries integrados.",
+               entidade=CABECALHOS.nome, sucessos=len(aceitos_cab), falhas=falhas)
+
+    except Exception as e:
+        log.excecao(f"Lote de pedidos {primeiro}..{ultimo} - Erro: {str(e)}")
+
+
+def marcados_item_e_series(diario, chaves):
+    diario.registrar_marcados(ITENS.nome, chaves)
+    diario.registrar_marcados(SERIES.nome, chaves)
+
+
+def sincronizar_pedidos(a_partir_de=None):
+    """Integra pedidos completos (AD_TGSCAB + AD_TGSITE + AD_TGSSER) numa única passada.
+
+    Lê os pedidos pendentes em páginas e, para cada lote, busca os itens de
+    todos eles numa só consulta (id_pedido IN ...). Cabeçalhos, itens e séries
+    do lote seguem juntos para o mesmo worker. Itens de pedidos já integrados
+    que ficaram para trás continuam com TGSITE/TGSSER.
+    Retorna {"lidos": pedidos lidos, "ultima_chave": maior id_pedido lido}.
+    """
+    total, ultima_chave = 0, a_partir_de
+
+    def criar_marcadores(conn, trava):
+        diario = obter_diario()
+        return {
+            "cab": Marcador(conn, "pedidos", "id_pedido", lock=trava,
+                            ao_gravar=lambda chaves: diario.registrar_marcados(CABECALHOS.nome, chaves)),
+            "ite": Marcador(conn, "pedido_itens", "id_item", lock=trava,
+                            ao_gravar=lambda chaves: diario.registrar_marcados(ITENS.nome, chaves)),
+            "ser": Marcador(conn, "pedido_itens", "id_item", coluna="integradoser", lock=trava,
+                            ao_gravar=lambda chaves: diario.registrar_marcados(SERIES.nome, chaves)),
+            "ambos": Marcador(conn, "pedido_itens", "id_item", coluna=("integrado", "integradoser"), lock=trava,
+                              ao_gravar=lambda chaves: marcados_item_e_series(diario, chaves)),
+        }
+
+    retomar = [(CABECALHOS, "cab"), (ITENS, "ite"), (SERIES, "ser")]
+    with sessao(criar_marcadores, retomar, CABECALHOS) as (conn_leitura, _, marcadores, reserva):
+        pedidos = ler_pendentes(conn_leitura, CABECALHOS.select, CABECALHOS.chave, CABECALHOS.filtro,
+                                inicio=a_partir_de, reserva=(CABECALHOS.tabela, CABECALHOS.coluna_status))
+        lote = []
+
+        def submeter(despachante, lote):
+            minhas = set(ainda_reservados(reserva, CABECALHOS, [p["id_pedido"] for p in lote]))
+            lote = [p for p in lote if p["id_pedido"] in minhas]
+            if not lote:
+                return
+            itens = ler_por_chaves(conn_leitura, SELECT_ITENS_PEDIDO, "id_pedido", [p["id_pedido"] for p in lote],
+                                   "integrado IS NULL OR integradoser IS NULL")
+            # Cada lote de pedidos é independente: vai para o primeiro worker livre
+            despachante.submeter(None, enviar_pedidos, lote, itens, marcadores, reserva)
+
+        with Despachante() as despachante:
+            for pedido in pedidos:
+                total += 1
+                ultima_chave = pedido["id_pedido"]
+                lote.append(pedido)
+                if len(lote) >= tamanho_lote(CABECALHOS.nome):
+                    submeter(despachante, lote)
+                    lote = []
+
+            if lote:
+                submeter(despachante, lote)
+
+        log.info(f"{total} pedidos lidos.")
+
+    return {"lidos": total, "ultima_chave": ultima_chave}
@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import sys
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Os testes não gravam arquivos de cache nem escrevem no console
+os.environ.setdefault("LOG_CONSOLE", "0")
+os.environ["SANKHYA_LOTE_ARQUIVO"] = ""
+os.environ["SANKHYA_TOKEN_CACHE"] = ""
+
+
+def _ausente(nome):
+    try:
+        return importlib.util.find_spec(nome) is None
+    except (ImportError, ValueError):
+        return nome not in sys.modules
+
+
+# Os testes não acessam rede, MySQL nem .env: sem essas bibliotecas instaladas,
+# só o que os módulos usam ao serem importados é preenchido
+if _ausente("dotenv"):
+    dotenv = types.ModuleType("dotenv")
+    dotenv.load_dotenv = lambda *args, **kwargs: None
+    sys.modules["dotenv"] = dotenv
+
+if _ausente("requests"):
+    class _Sessao:
+        def mount(self, prefixo, adaptador):
+            pass
+
+        def close(self):
+            pass
+
+    requests = types.ModuleType("requests")
+    requests.Session = _Sessao
+    adapters = types.ModuleType("requests.adapters")
+    adapters.HTTPAdapter = lambda *args, **kwargs: None
+    requests.adapters = adapters
+    sys.modules["requests"] = requests
+    sys.modules["requests.adapters"] = adapters
+
+if _ausente("mysql.connector"):
+    class _ErroMysql(Exception):
+        def __init__(self, *args, errno=None, **kwargs):
+            super().__init__(*args)
+            self.errno = errno
+
+    mysql = types.ModuleType("mysql")
+    connector = types.ModuleType("mysql.connector")
+    pooling = types.ModuleType("mysql.connector.pooling")
+    connector.Error = _ErroMysql
+    connector.pooling = pooling
+    mysql.connector = connector
+    sys.modules["mysql"] = mysql
+    sys.modules["mysql.connector"] = connector
+    sys.modules["mysql.connector.pooling"] = pooling
@@ -0,0 +1,85 @@
+import pytest
+
+import banco
+from banco import Reserva
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+        self._linhas = []
+
+    def execute(self, sql, parametros=()):
+        self.conn.comandos.append(sql.split()[0])
+        if sql.startswith("SELECT"):
+            chaves = parametros[:-1]
+            self._linhas = [(c,) for c in chaves if c in self.conn.minhas]
+
+    def fetchall(self):
+        return self._linhas
+
+    def close(self):
+        pass
+
+
+class ConexaoFalsa:
+    """Responde ao renovar_reserva: as chaves em minhas continuam com este worker."""
+
+    def __init__(self, minhas):
+        self.minhas = set(minhas)
+        self.comandos = []
+
+    def cursor(self, **kwargs):
+        return CursorFalso(self)
+
+    def commit(self):
+        self.comandos.append("COMMIT")
+
+
+@pytest.fixture
+def modo_reserva(monkeypatch):
+    monkeypatch.setattr(banco, "MODO_RESERVA", True)
+
+
+def test_sem_modo_reserva_nao_consulta_o_banco():
+    conn = ConexaoFalsa([])
+    reserva = Reserva(conn, "pedidos", "id_pedido", margem=360, duracao=60)
+    assert reserva.renovar([1, 2]) == [1, 2]
+    reserva.garantir([1, 2])
+    assert conn.comandos == []
+
+
+def test_recusa_validade_menor_que_uma_tentativa(modo_reserva):
+    with pytest.raises(Exception, match="MYSQL_RESERVA_SEGUNDOS=300"):
+        Reserva(ConexaoFalsa([]), "pedidos", "id_pedido", margem=360, duracao=300)
+
+
+def test_renova_uma_vez_enquanto_a_validade_cobre_a_tentativa(modo_reserva):
+    conn = ConexaoFalsa([1, 2, 3])
+    reserva = Reserva(conn, "pedidos", "id_pedido", margem=360, duracao=900)
+    assert reserva.renovar([1, 2, 3]) == [1, 2, 3]
+    assert conn.comandos == ["UPDATE", "SELECT", "COMMIT"]
+
+    # Sub-lotes e novas tentativas logo depois não voltam ao banco
+    reserva.garantir([1, 2])
+    reserva.garantir([3])
+    assert conn.comandos == ["UPDATE", "SELECT", "COMMIT"]
+
+
+def test_renova_de_novo_quando_a_validade_pode_vencer(modo_reserva, monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(banco.time, "monotonic", lambda: agora[0])
+    conn = ConexaoFalsa([1])
+    reserva = Reserva(conn, "pedidos", "id_pedido", margem=360, duracao=900)
+    reserva.garantir([1])
+    agora[0] += 600  # restam 300s, menos que uma tentativa
+    reserva.garantir([1])
+    assert conn.comandos.count("UPDATE") == 2
+
+
+def test_reserva_retomada_por_outro_worker(modo_reserva):
+    conn = ConexaoFalsa([1, 3])
+    reserva = Reserva(conn, "pedidos", "id_pedido", margem=360, duracao=900)
+    assert reserva.renovar([1, 2, 3]) == [1, 3]
+    with pytest.raises(Exception, match="Reserva de 1 registros de pedidos vencida"):
+        reserva.garantir([2, 3])
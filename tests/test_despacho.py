@@ -0,0 +1,67 @@
+import threading
+import time
+
+from despacho import Despachante
+
+
+def test_lotes_se_espalham_pelos_workers():
+    nomes = []
+    trava = threading.Lock()
+
+    def enviar(_lote):
+        time.sleep(0.05)
+        with trava:
+            nomes.append(threading.current_thread().name)
+
+    inicio = time.perf_counter()
+    with Despachante(workers=4) as despachante:
+        # Chaves contíguas e lotes de tamanho múltiplo do número de workers, como no sincronizar
+        for primeiro in range(0, 1600, 100):
+            despachante.submeter(None, enviar, list(range(primeiro, primeiro + 100)))
+    decorrido = time.perf_counter() - inicio
+
+    assert len(nomes) == 16
+    assert set(nomes) == {f"despacho-{n}" for n in range(4)}
+    # 16 lotes de 50 ms em 4 workers: ~0,2s, contra 0,8s em sequência
+    assert decorrido < 0.6
+
+
+def test_mesma_chave_roda_no_mesmo_worker_em_ordem():
+    vistos = {}
+    trava = threading.Lock()
+
+    def tarefa(chave, ordem):
+        time.sleep(0.001)
+        with trava:
+            vistos.setdefault(chave, []).append((ordem, threading.current_thread().name))
+
+    with Despachante(workers=4) as despachante:
+        for ordem in range(10):
+            for chave in ("a", "b", "c"):
+                despachante.submeter(chave, tarefa, chave, ordem)
+
+    for chave, execucoes in vistos.items():
+        assert [ordem for ordem, _ in execucoes] == list(range(10))
+        assert len({nome for _, nome in execucoes}) == 1
+
+
+def test_tarefas_com_e_sem_chave_terminam_antes_de_aguardar():
+    feitas = []
+    trava = threading.Lock()
+
+    def tarefa(n):
+        with trava:
+            feitas.append(n)
+
+    with Despachante(workers=3) as despachante:
+        for n in range(50):
+            despachante.submeter(None if n % 2 else n, tarefa, n)
+
+    assert sorted(feitas) == list(range(50))
+
+
+def test_sequencial_com_um_worker():
+    nomes = []
+    with Despachante(workers=1) as despachante:
+        despachante.submeter(None, lambda: nomes.append(threading.current_thread().name))
+    assert nomes == [threading.current_thread().name]
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+
+import diario
+from diario import ENVIADO, MARCADO, PENDENTE, Diario
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    return str(tmp_path / "diario.db")
+
+
+def estados(d, entidade):
+    cursor = d._conn.execute("SELECT chave, estado FROM registros WHERE entidade = ? ORDER BY chave", (entidade,))
+    return {diario._decodificar(chave): estado for chave, estado in cursor}
+
+
+def envelhecer(d, entidade, chaves, dias):
+    d._conn.executemany(
+        "UPDATE registros SET atualizado_em = ? WHERE entidade = ? AND chave = ?",
+        [(time.time() - dias * 86400, entidade, diario._codificar(c)) for c in chaves],
+    )
+    d._conn.commit()
+
+
+def test_ciclo_pendente_enviado_marcado(arquivo):
+    d = Diario(arquivo)
+    d.registrar_pendentes("CAB", [(1, {"0": 1}), (2, {"0": 2})])
+    assert estados(d, "CAB") == {1: PENDENTE, 2: PENDENTE}
+    assert d.ja_enviados("CAB", [1, 2]) == set()
+    assert d.grupos_a_marcar("CAB") == []
+
+    d.registrar_enviados("CAB", [1])
+    assert d.ja_enviados("CAB", [1, 2]) == {1}
+    assert d.grupos_a_marcar("CAB") == [1]
+
+    d.registrar_marcados("CAB", [1])
+    assert estados(d, "CAB") == {1: MARCADO, 2: PENDENTE}
+    assert d.ja_enviados("CAB", [1, 2]) == set()
+    assert d.grupos_a_marcar("CAB") == []
+
+
+def test_enviado_nao_volta_a_pendente(arquivo):
+    d = Diario(arquivo)
+    d.registrar_pendentes("ITE", [(7, {"0": 7})])
+    d.registrar_enviados("ITE", [7])
+    d.registrar_pendentes("ITE", [(7, {"0": 7})])
+    assert estados(d, "ITE") == {7: ENVIADO}
+
+
+def test_series_marcam_o_item_so_com_todas_enviadas(arquivo):
+    d = Diario(arquivo)
+    series = [((10, "A"), {"0": "A"}), ((10, "B"), {"0": "B"}), ((11, "C"), {"0": "C"})]
+    d.registrar_pendentes("SER", series, grupo=lambda chave: chave[0])
+
+    d.registrar_enviados("SER", [(10, "A"), (11, "C")])
+    assert d.ja_enviados("SER", [(10, "A"), (10, "B")]) == {(10, "A")}
+    assert d.grupos_a_marcar("SER") == [11]
+
+    d.registrar_enviados("SER", [(10, "B")])
+    assert sorted(d.grupos_a_marcar("SER")) == [10, 11]
+
+    d.registrar_marcados("SER", [10, 11])
+    assert set(estados(d, "SER").values()) == {MARCADO}
+
+
+def test_retencao_remove_marcados_e_grupos_com_pendentes_antigos(arquivo, monkeypatch):
+    monkeypatch.setattr(diario, "RETENCAO_DIAS", 7)
+    d = Diario(arquivo)
+    d.registrar_pendentes("SER", [((1, "A"), {}), ((1, "B"), {}), ((2, "C"), {}), ((3, "D"), {})],
+                          grupo=lambda chave: chave[0])
+    d.registrar_enviados("SER", [(1, "A"), (2, "C")])
+    d.registrar_marcados("SER", [2])
+    envelhecer(d, "SER", [(1, "B"), (2, "C"), (3, "D")], dias=8)
+    d._conn.close()
+
+    d = Diario(arquivo)
+    # O item 1 sai inteiro: marcar só a série enviada deixaria a B de fora do Sankhya
+    assert estados(d, "SER") == {}
+    assert d.grupos_a_marcar("SER") == []
+
+
+def test_retencao_mantem_registros_recentes(arquivo, monkeypatch):
+    monkeypatch.setattr(diario, "RETENCAO_DIAS", 7)
+    d = Diario(arquivo)
+    d.registrar_pendentes("CAB", [(1, {}), (2, {}), (3, {})])
+    d.registrar_enviados("CAB", [2, 3])
+    d.registrar_marcados("CAB", [3])
+    envelhecer(d, "CAB", [2], dias=30)
+    d._conn.close()
+
+    d = Diario(arquivo)
+    assert estados(d, "CAB") == {1: PENDENTE, 2: ENVIADO, 3: MARCADO}
+
+
+def test_integrados_sem_retencao(arquivo):
+    d = Diario(arquivo)
+    d.registrar_integrados("PAR", ["12345678900", "12345678900", 42])
+    assert d.ja_integrados("PAR", ["12345678900", "42", "1"]) == {"12345678900", "42"}
+    assert d.ja_integrados("CAB", ["42"]) == set()
+
+
+def test_retencao_entre_ciclos_na_mesma_instancia(arquivo, monkeypatch):
+    # Como no daemon.py: um único Diario para o processo inteiro
+    monkeypatch.setattr(diario, "RETENCAO_DIAS", 7)
+    relogio = [1000.0]
+    monkeypatch.setattr(diario.time, "monotonic", lambda: relogio[0])
+    d = Diario(arquivo)
+
+    # Ciclo 1: um item marcado e um envio que falhou
+    d.registrar_pendentes("CAB", [(1, {}), (2, {})])
+    d.registrar_enviados("CAB", [1])
+    d.registrar_marcados("CAB", [1])
+    d.limpar_periodicamente()
+    assert estados(d, "CAB") == {1: MARCADO, 2: PENDENTE}
+
+    # Oito dias depois, ainda no mesmo processo
+    envelhecer(d, "CAB", [1, 2], dias=8)
+    relogio[0] += diario.LIMPEZA_INTERVALO - 1
+    d.limpar_periodicamente()
+    assert estados(d, "CAB") == {1: MARCADO, 2: PENDENTE}
+
+    # Ciclo 2: passado o intervalo, a retenção roda sem recriar o diário
+    relogio[0] += 1
+    d.registrar_pendentes("CAB", [(3, {})])
+    d.limpar_periodicamente()
+    assert estados(d, "CAB") == {3: PENDENTE}
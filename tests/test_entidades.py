@@ -0,0 +1,41 @@
+import pytest
+
+import entidades
+from entidades import PARCEIROS, CidadesDoLote
+from municipios import IndiceCidades, Municipio
+
+
+@pytest.fixture
+def mensagens(monkeypatch):
+    registradas = {"aviso": [], "debug": []}
+    monkeypatch.setattr(entidades.log, "aviso", lambda mensagem, *args, **campos: registradas["aviso"].append(mensagem))
+    monkeypatch.setattr(entidades.log, "debug", lambda mensagem, *args, **campos: registradas["debug"].append(args))
+    return registradas
+
+
+def cliente(i, cidade):
+    return {"id_cliente": i, "nome": f"Cliente {i}", "documento": f"{i:011d}", "email": "", "telefone": "",
+            "rua": "", "numero": "", "cep": "", "bairro": "", "cidade": cidade, "estado": "SP", "complemento": ""}
+
+
+def test_cidades_sem_codigo_num_aviso_por_lote(mensagens):
+    cidades = CidadesDoLote(IndiceCidades.de_municipios([Municipio(3550308, "São Paulo", "SP")]))
+    lote = [PARCEIROS.valores(cliente(i, cidade), cidades)
+            for i, cidade in enumerate(["São Paulo", "Xyzwq", "Qwvzk", "São Paulo"])]
+    PARCEIROS.fechar_lote(cidades)
+
+    assert [values["9"] for values in lote] == [3550308, "Xyzwq", "Qwvzk", 3550308]
+    assert mensagens["aviso"] == ["2 clientes do lote com cidade sem código IBGE. CODCID irá com o nome da cidade."]
+    assert [args[0] for args in mensagens["debug"]] == [1, 2]
+
+    # O próximo lote conta do zero; sem faltas, nenhum aviso
+    PARCEIROS.valores(cliente(9, "São Paulo"), cidades)
+    PARCEIROS.fechar_lote(cidades)
+    assert len(mensagens["aviso"]) == 1
+
+
+def test_sem_indice_nao_conta_nem_avisa(mensagens):
+    cidades = CidadesDoLote(None)
+    assert PARCEIROS.valores(cliente(1, "Xyzwq"), cidades)["9"] == "Xyzwq"
+    PARCEIROS.fechar_lote(cidades)
+    assert mensagens == {"aviso": [], "debug": []}
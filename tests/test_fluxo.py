@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from fluxo import _itens_raw_decode, registros_json
+
+LISTA = [
+    {"id": 3550308, "nome": "São Paulo", "microrregiao": {"mesorregiao": {"UF": {"sigla": "SP"}}}},
+    {"id": 5300108, "nome": "Brasília", "area": 5760.78, "capital": True},
+    12345678,
+    -0.5,
+    "Açaí – ção",
+    None,
+    [],
+    {},
+]
+
+
+def pedacos(dados, tamanho):
+    return [dados[i : i + tamanho] for i in range(0, len(dados), tamanho)]
+
+
+@pytest.mark.parametrize("tamanho", [1, 2, 3, 7, 64, 100000])
+def test_le_a_lista_em_qualquer_tamanho_de_pedaco(tamanho):
+    # Pedaços de 1 a 3 bytes cortam números e caracteres UTF-8 de vários bytes ao meio
+    dados = json.dumps(LISTA, ensure_ascii=False).encode("utf-8")
+    assert list(_itens_raw_decode(pedacos(dados, tamanho))) == LISTA
+
+
+def test_numero_cortado_no_fim_do_pedaco():
+    assert list(_itens_raw_decode([b"[12", b"34, 5", b"6]"])) == [1234, 56]
+    assert list(_itens_raw_decode([b"[1.", b"5e", b"3]"])) == [1500.0]
+
+
+def test_espacos_e_lista_vazia():
+    assert list(_itens_raw_decode([b"  \n[", b" ]  "])) == []
+    assert list(_itens_raw_decode([b"\t[ 1 ,\r\n 2 ]"])) == [1, 2]
+
+
+def test_le_sob_demanda():
+    def gerador():
+        yield b'[{"a": 1}, '
+        raise AssertionError("leu além do necessário")
+
+    itens = _itens_raw_decode(gerador())
+    assert next(itens) == {"a": 1}
+
+
+def test_resposta_que_nao_e_lista():
+    with pytest.raises(ValueError, match="não é uma lista"):
+        list(_itens_raw_decode([b'{"erro": "x"}']))
+
+
+def test_lista_nao_fechada():
+    with pytest.raises(ValueError, match="não foi fechada"):
+        list(_itens_raw_decode([b"[1, 2"]))
+
+
+def test_elemento_incompleto():
+    with pytest.raises(ValueError):
+        list(_itens_raw_decode([b'[{"id": 1', b', "nome": "x"']))
+
+
+def test_registros_json_descarta_convertidos_em_none():
+    dados = json.dumps([{"id": 1}, {"id": 2}, {"id": 3}]).encode("utf-8")
+    convertidos = registros_json(pedacos(dados, 5), lambda item: item["id"] if item["id"] != 2 else None)
+    assert list(convertidos) == [1, 3]
+
+
+def test_elementos_sem_separador():
+    with pytest.raises(ValueError, match="esperava ',' ou ']'"):
+        list(_itens_raw_decode([b'[{"a": 1} {"b": 2}]']))
+    with pytest.raises(ValueError, match="esperava ',' ou ']'"):
+        list(_itens_raw_decode([b"[1 x", b"]"]))
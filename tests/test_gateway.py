@@ -0,0 +1,46 @@
+import pytest
+
+import gateway
+
+
+class Resposta:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+@pytest.fixture
+def gw(monkeypatch):
+    monkeypatch.setattr(gateway, "RETENTATIVAS", 2)
+    monkeypatch.setattr(gateway.time, "sleep", lambda segundos: None)
+    return gateway.Gateway()
+
+
+def test_antes_de_tentar_roda_antes_de_cada_tentativa(gw):
+    eventos = []
+    respostas = iter([Resposta(503), Resposta(503), Resposta(200)])
+
+    def requisicao():
+        eventos.append("post")
+        return next(respostas)
+
+    resposta = gw.executar(requisicao, antes_de_tentar=lambda: eventos.append("reserva"))
+    assert resposta.status_code == 200
+    assert eventos == ["reserva", "post"] * 3
+
+
+def test_excecao_em_antes_de_tentar_cancela_sem_nova_tentativa(gw):
+    eventos = []
+
+    def antes_de_tentar():
+        eventos.append("reserva")
+        if len(eventos) > 1:
+            raise Exception("reserva perdida")
+
+    def requisicao():
+        eventos.append("post")
+        return Resposta(503)
+
+    with pytest.raises(Exception, match="reserva perdida"):
+        gw.executar(requisicao, antes_de_tentar=antes_de_tentar)
+    assert eventos == ["reserva", "post", "reserva"]
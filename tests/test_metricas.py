@@ -0,0 +1,19 @@
+import metricas
+
+
+def test_contador_exporta_inteiros_grandes_sem_arredondar():
+    c = metricas.Contador("teste_bytes_total", "bytes")
+    c.inc(1234567, entidade="AD_TGSCAB")
+    c.inc(10 ** 12 + 1, entidade="AD_TGSITE")
+    assert c.linhas() == [
+        'teste_bytes_total{entidade="AD_TGSCAB"} 1234567',
+        'teste_bytes_total{entidade="AD_TGSITE"} 1000000000001',
+    ]
+
+
+def test_medidor_exporta_floats_com_todos_os_digitos():
+    m = metricas.Medidor("teste_medidor", "valor")
+    m.definir(1234567.125)
+    assert m.linhas() == ["teste_medidor 1234567.125"]
+    m.definir(float("inf"))
+    assert m.linhas() == ["teste_medidor +Inf"]
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+import sankhya
+
+
+class Resposta:
+    def __init__(self, status_code, dados=None):
+        self.status_code = status_code
+        self._dados = dados
+        self.text = json.dumps(dados)
+        self.headers = {}
+
+    def json(self):
+        return self._dados
+
+
+class ApiFalsa:
+    """Substitui enviar_payload: guarda as chaves de cada chamada e responde conforme responder(chaves)."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.chamadas = []
+
+    def __call__(self, corpo, timeout=120, ao_tentar=None, antes_de_tentar=None):
+        registros = json.loads(corpo)["requestBody"]["records"]
+        chaves = [r["values"]["0"] for r in registros]
+        if antes_de_tentar:
+            antes_de_tentar()
+        self.chamadas.append(chaves)
+        resposta = self.responder(chaves)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+
+def itens(n):
+    return [(i, {"0": i, "1": f"registro {i}"}) for i in range(n)]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    def instalar(responder):
+        falsa = ApiFalsa(responder)
+        monkeypatch.setattr(sankhya, "enviar_payload", falsa)
+        return falsa
+    return instalar
+
+
+def test_lote_aceito_numa_chamada(api):
+    falsa = api(lambda chaves: Resposta(200, {"status": "1"}))
+    sucessos, falhas = sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(8))
+    assert sucessos == list(range(8))
+    assert falhas == []
+    assert len(falsa.chamadas) == 1
+
+
+def test_recusa_de_dados_divide_ate_isolar_o_registro(api):
+    ruins = {5, 11}
+    falsa = api(lambda chaves: Resposta(200, {"status": "ERROR", "statusMessage": "inválido"})
+                if ruins & set(chaves) else Resposta(200, {"status": "1"}))
+    sucessos, falhas = sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(16))
+
+    assert sorted(sucessos) == sorted(set(range(16)) - ruins)
+    assert [chave for chave, _ in falhas] == [5, 11]
+    assert all(detalhe["status"] == "ERROR" for _, detalhe in falhas)
+    assert [5] in falsa.chamadas and [11] in falsa.chamadas
+    # Bem menos que os 16 envios unitários
+    assert len(falsa.chamadas) < 16
+
+
+def test_registro_unico_recusado_nao_divide(api):
+    falsa = api(lambda chaves: Resposta(200, {"status": "ERROR"}))
+    sucessos, falhas = sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(1))
+    assert sucessos == []
+    assert [chave for chave, _ in falhas] == [0]
+    assert len(falsa.chamadas) == 1
+
+
+@pytest.mark.parametrize("resposta", [
+    Resposta(503, {"erro": "indisponível"}),
+    Resposta(429, {"erro": "limite"}),
+    Resposta(401, {"erro": "token"}),
+    TimeoutError("tempo esgotado"),
+])
+def test_falha_de_transporte_devolve_o_lote_sem_dividir(api, resposta):
+    falsa = api(lambda chaves: resposta)
+    sucessos, falhas = sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(16))
+    assert sucessos == []
+    assert [chave for chave, _ in falhas] == list(range(16))
+    assert len(falsa.chamadas) == 1
+
+
+def test_reserva_garantida_antes_de_cada_sub_lote(api):
+    garantidas = []
+    falsa = api(lambda chaves: Resposta(200, {"status": "ERROR"}) if 3 in chaves else Resposta(200, {"status": "1"}))
+    sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(4), reservar=garantidas.append)
+    assert garantidas == falsa.chamadas == [[0, 1, 2, 3], [0, 1], [2, 3], [2], [3]]
+
+
+def test_reserva_perdida_cancela_o_envio_sem_dividir(api):
+    def reservar(chaves):
+        raise Exception("Reserva vencida e retomada por outro worker.")
+
+    falsa = api(lambda chaves: Resposta(200, {"status": "1"}))
+    sucessos, falhas = sankhya.salvar_registros("TESTE", ["ID", "NOME"], itens(8), reservar=reservar)
+    assert sucessos == []
+    assert [chave for chave, _ in falhas] == list(range(8))
+    assert falsa.chamadas == []